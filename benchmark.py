@@ -0,0 +1,261 @@
+"""Benchmark for style_checker.py.
+
+Generates a synthetic C file, times BaseChecker.check_styles end to end and per
+checker class, and compares the numbers with a stored baseline.
+
+    python benchmark.py --lines 20000 --violations 0.2 --save-baseline bench_baseline.json
+    python benchmark.py --lines 20000 --violations 0.2 --baseline bench_baseline.json
+"""
+from collections import OrderedDict
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import style_checker
+
+STD_HEADERS = ["assert.h", "ctype.h", "errno.h", "limits.h", "math.h", "stdbool.h", "stddef.h",
+               "stdint.h", "stdio.h", "stdlib.h", "string.h", "time.h"]
+OPERATORS = ["+", "-", "*", "/", "%", "<", ">", "<=", ">=", "==", "!=", "&&", "||", "&", "|", "^", "<<", ">>"]
+BASE_TYPES = ["int", "long", "char", "double", "float", "short"]
+
+class SourceGenerator:
+    """Builds C source with a tunable size and density of style violations.
+
+    violations is the probability (0 to 1) that any construct is written the
+    wrong way (missing spaces, tabs, misplaced braces, overlong lines, ...)."""
+    def __init__(self, violations=0.1, seed=0, max_depth=6, typedefs=200, includes=30):
+        self.violations = violations
+        self.random = random.Random(seed)
+        self.max_depth = max_depth
+        self.typedefs = typedefs
+        self.includes = includes
+        self.type_names = list(BASE_TYPES)
+        self.lines = []
+
+    def bad(self):
+        return self.random.random() < self.violations
+
+    def emit(self, depth, text):
+        indent = "    " * depth
+        if depth and self.bad():
+            indent = self.random.choice(["\t" * depth, "  " * depth, "    " * (depth + 1)])
+        self.lines.append(indent + text)
+
+    def identifier(self):
+        words = self.random.sample(["count", "total", "index", "value", "buffer", "node", "size", "next", "left", "right"], 2)
+        if self.bad():
+            return words[0] + words[1].capitalize()
+        return "_".join(words)
+
+    def expression(self, terms):
+        spacing = "" if self.bad() else " "
+        parts = [self.random.choice(["a", "b", "count", "(a + b)", "arr[i]", "2", "node->size"])]
+        for _ in range(terms - 1):
+            parts.append(self.random.choice(OPERATORS))
+            parts.append(self.random.choice(["a", "b", "total", "3", "(b - 1)", "values[j]"]))
+        return spacing.join(parts)
+
+    def header(self):
+        self.lines.extend(["/*", " * Synthetic benchmark input", " * Author: Bench Mark - bench@example.edu", " */"])
+        std_headers = list(STD_HEADERS)
+        custom_headers = sorted("module" + str(i) + ".h" for i in range(self.includes))
+        for headers in (std_headers, custom_headers):
+            if self.bad():
+                self.random.shuffle(headers)
+        self.lines.extend(["#include <" + header + ">" for header in std_headers])
+        self.lines.extend(["#include \"" + header + "\"" for header in custom_headers])
+        self.lines.append("")
+        self.lines.append("#define LIMIT 100")
+        self.lines.append("")
+        for i in range(self.typedefs):
+            name = "type" + str(i) + "_t"
+            self.lines.append("typedef struct Record" + str(i) + " " + name + ";")
+            self.type_names.append(name)
+        self.lines.append("")
+
+    def block(self, depth):
+        keyword = self.random.choice(["if (a > b)", "while (count < LIMIT)", "for (i = 0; i < n; i++)", "switch (value)"])
+        if self.bad():
+            keyword = keyword.replace(" (", "(", 1)
+        if self.bad():
+            self.emit(depth, keyword)
+            self.emit(depth, "{")
+        else:
+            self.emit(depth, keyword + " {")
+        if keyword.startswith("switch"):
+            self.emit(depth + 1, "case 1:")
+            self.emit(depth + 2, "break;")
+        else:
+            self.statements(depth + 1)
+        self.emit(depth, "}")
+
+    def statements(self, depth):
+        for _ in range(self.random.randint(1, 5)):
+            roll = self.random.random()
+            if roll < 0.25 and depth < self.max_depth:
+                self.block(depth)
+            elif roll < 0.35:
+                long_line = "total = " + self.expression(self.random.randint(20, 40)) + ";"
+                self.emit(depth, long_line)
+            elif roll < 0.45:
+                self.emit(depth, "printf(\"%d {} a+b\\n\", " + self.expression(3) + "); // " + self.expression(3))
+            else:
+                self.emit(depth, self.identifier() + " = " + self.expression(self.random.randint(2, 8)) + ";")
+
+    def function(self):
+        return_type = self.random.choice(self.type_names)
+        signature = return_type + " " + self.identifier() + "(int a, int b)"
+        if self.bad():
+            self.lines.append(signature)
+            self.lines.append("{")
+        else:
+            self.lines.append(signature + " {")
+        self.statements(1)
+        self.lines.append("    return a;")
+        self.lines.append("}")
+        self.lines.append("")
+
+    def generate(self, line_count):
+        self.header()
+        while len(self.lines) < line_count:
+            self.function()
+        return [line + "\n" for line in self.lines[:line_count]]
+
+class TimedChecker:
+    """Wraps a style checker and adds up the time spent in its check_styles."""
+    def __init__(self, checker):
+        self.checker = checker
+        self.elapsed = 0.0
+        if hasattr(checker, "line_window"):
+            self.line_window = checker.line_window
+
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
+        start = time.perf_counter()
+        done = self.checker.check_styles(line, stripped_line, line_count, output, line_info)
+        self.elapsed += time.perf_counter() - start
+        return done
+
+    def finalize(self, line_count, output):
+        self.checker.finalize(line_count, output)
+
+    def count_errors(self, error_count):
+        self.checker.count_errors(error_count)
+
+def run_checkers(lines, checkers):
+    output = style_checker.new_output()
+    error_count = style_checker.new_error_count()
+    start = time.perf_counter()
+    style_checker.BaseChecker(checkers).check_styles(lines, output, error_count)
+    elapsed = time.perf_counter() - start
+    style_checker.close_output(output)
+    return elapsed
+
+def time_lexer(lines):
+    lexer = style_checker.CLexer()
+    start = time.perf_counter()
+    for line in lines:
+        lexer.scan(line)
+    return time.perf_counter() - start
+
+def measure(lines, repeat):
+    """Returns the benchmark results as an ordered dict: seconds per timing, plus rate and memory."""
+    results = OrderedDict()
+    results["lines"] = len(lines)
+    results["total"] = min(run_checkers(lines, style_checker.make_checkers()) for _ in range(repeat))
+    results["lines_per_second"] = len(lines) / results["total"]
+    results["lexer"] = min(time_lexer(lines) for _ in range(repeat))
+
+    # Per checker: best of the runs with every checker wrapped in a timer
+    checker_times = OrderedDict()
+    for _ in range(repeat):
+        timed_checkers = [TimedChecker(checker) for checker in style_checker.make_checkers()]
+        run_checkers(lines, timed_checkers)
+        for timed_checker in timed_checkers:
+            name = timed_checker.checker.__class__.__name__
+            checker_times[name] = min(checker_times.get(name, timed_checker.elapsed), timed_checker.elapsed)
+    results.update(checker_times)
+
+    tracemalloc.start()
+    run_checkers(lines, style_checker.make_checkers())
+    results["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return results
+
+def print_results(results, baseline=None):
+    print("Lines: " + str(results["lines"]))
+    print("Throughput: " + str(int(results["lines_per_second"])) + " lines/s")
+    print("Peak memory: " + str(round(results["peak_memory_bytes"] / 1024.0 / 1024.0, 2)) + " MB")
+    print("")
+    print("%-26s %12s %12s %10s" % ("Timing", "seconds", "us/line", "baseline"))
+    for key, value in results.items():
+        if key in ("lines", "lines_per_second", "peak_memory_bytes"):
+            continue
+        change = ""
+        if baseline and baseline.get(key):
+            per_line_ratio = (value / results["lines"]) / (baseline[key] / baseline["lines"])
+            change = "%+.1f%%" % ((per_line_ratio - 1) * 100)
+        print("%-26s %12.4f %12.2f %10s" % (key, value, value / results["lines"] * 1e6, change))
+
+def find_regressions(results, baseline, tolerance, min_share=0.05):
+    """Names of timings (and peak memory) that are more than tolerance slower/larger than the baseline.
+    Timings that took less than min_share of the baseline total are too small to compare reliably."""
+    regressions = []
+    for key, value in results.items():
+        if key in ("lines", "lines_per_second") or not baseline.get(key):
+            continue
+        if key != "peak_memory_bytes" and baseline[key] < baseline["total"] * min_share:
+            continue
+        # Per-line cost, so baselines taken with a different --lines still compare
+        per_line = value / results["lines"]
+        baseline_per_line = baseline[key] / baseline["lines"]
+        if per_line > baseline_per_line * (1 + tolerance):
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark style_checker.py on generated C source")
+    parser.add_argument("--lines", type=int, default=20000, help="size of the generated file (default: 20000)")
+    parser.add_argument("--violations", type=float, default=0.1,
+                        help="probability that a construct violates the style guide (default: 0.1)")
+    parser.add_argument("--typedefs", type=int, default=200, help="number of typedefs (default: 200)")
+    parser.add_argument("--depth", type=int, default=6, help="maximum block nesting (default: 6)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing, the best one counts (default: 3)")
+    parser.add_argument("--write-source", metavar="FILE", help="also write the generated C source to FILE")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with the results stored in FILE")
+    parser.add_argument("--save-baseline", metavar="FILE", help="store the results in FILE")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed slowdown against the baseline before it counts as a regression (default: 0.15)")
+    parser.add_argument("--min-share", type=float, default=0.05,
+                        help="only compare timings that took at least this share of the baseline total (default: 0.05)")
+    args = parser.parse_args()
+
+    generator = SourceGenerator(args.violations, args.seed, args.depth, args.typedefs)
+    lines = generator.generate(args.lines)
+    if args.write_source:
+        with open(args.write_source, "w") as source_fd:
+            source_fd.writelines(lines)
+
+    results = measure(lines, args.repeat)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_fd:
+            baseline = json.load(baseline_fd)
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_fd:
+            json.dump(results, baseline_fd, indent=2)
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.tolerance, args.min_share)
+        if regressions:
+            print("\nRegressions: " + ", ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against " + args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,328 @@
-from collections import OrderedDict
 import sys
+
+if __name__ == "__main__" and [arg for arg in sys.argv[1:] if arg.partition("=")[0] == "--server"]:
+    # Hand the files to a running check server before importing what checking needs
+    import style_client
+    if style_client.main(sys.argv[1:]):
+        sys.exit(0)
+
+from collections import OrderedDict
+import argparse
+import io
+import json
+import os
+import time
 import re
+# configparser, copy, hashlib, heapq, mmap, socketserver, stat, subprocess, tempfile and
+# threading are imported where they are used: a plain check of one file needs none of them
+
+from style_client import CheckClient, collect_files, file_checker, print_results, print_summary
+
+class Diagnostic:
+    """A single finding.
+
+    The report text is only built from template and args when message() is called,
+    so formats that do not need prose (JSON Lines) never pay for it.
+    severity is "error", "warning" (e.g. lines over 80 characters) or "note"."""
+    __slots__ = ("checker", "rule", "line", "column", "severity", "template", "args")
+
+    def __init__(self, checker, rule, line, template, severity="error", column=None, **args):
+        self.checker = checker
+        self.rule = rule
+        self.line = line
+        self.column = column
+        self.severity = severity
+        self.template = template
+        self.args = args
+
+    def message(self):
+        return self.template.format(line=self.line, **self.args)
+
+    def __str__(self):
+        return self.message()
+
+    def moved(self, line_delta):
+        """Copy of the diagnostic for when lines were inserted or removed above it."""
+        if self.line is None or line_delta == 0:
+            return self
+        return Diagnostic(self.checker, self.rule, self.line + line_delta, self.template,
+                          severity=self.severity, column=self.column, **self.args)
+
+    def to_dict(self):
+        return OrderedDict([("checker", self.checker), ("rule", self.rule), ("line", self.line), ("column", self.column),
+                            ("severity", self.severity), ("template", self.template), ("args", self.args)])
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(record["checker"], record["rule"], record["line"], record["template"],
+                   severity=record["severity"], column=record["column"], **record["args"])
+
+def encode_item(item):
+    # Output buffers hold Diagnostics and a few plain note strings
+    return item.to_dict() if isinstance(item, Diagnostic) else item
+
+def decode_item(data):
+    return Diagnostic.from_dict(data) if isinstance(data, dict) else data
+
+class LineInfo:
+    """What CLexer found out about one line. Shared by all checkers so each line is scanned only once."""
+    __slots__ = ("code", "in_comment", "has_comment", "comment_only", "directive", "string_spans", "opens", "closes")
+
+class CLexer:
+    """Lightweight line-by-line C lexer.
+
+    For every line it produces a LineInfo with:
+    - code: the line with comments blanked out and string/char literal contents replaced by spaces
+      (same length as the line, so columns still line up)
+    - in_comment: the line starts inside a /* */ comment
+    - has_comment / comment_only: the line contains a comment / contains nothing but comments
+    - directive: name of the preprocessor directive ("include", "define", ...), None for other lines
+    - string_spans: (start, end) columns of string and char literals, quotes included
+    - opens / closes: number of curly braces in code
+    """
+    token_re = re.compile(r'"(?:\\.|[^"\\])*"?|\'(?:\\.|[^\'\\])*\'?|//|/\*')
+    directive_re = re.compile(r'\s*#\s*(\w*)')
+
+    def __init__(self):
+        self.in_comment = False
+
+    def scan(self, line):
+        info = LineInfo()
+        info.in_comment = self.in_comment
+        info.has_comment = self.in_comment
+        info.string_spans = ()
+
+        if not self.in_comment and "/" not in line and '"' not in line and "'" not in line:
+            code = line
+        else:
+            body = line.rstrip("\r\n")
+            parts = []
+            spans = []
+            pos = 0
+            while pos < len(body):
+                if self.in_comment:
+                    end = body.find("*/", pos)
+                    if end == -1:
+                        end = len(body)
+                    else:
+                        end += 2
+                        self.in_comment = False
+                    parts.append(" " * (end - pos))
+                    pos = end
+                    continue
+
+                match = self.token_re.search(body, pos)
+                if match is None:
+                    parts.append(body[pos:])
+                    break
+                start, end = match.span()
+                token = match.group(0)
+                parts.append(body[pos:start])
+                if token == "//":
+                    info.has_comment = True
+                    end = len(body)
+                    parts.append(" " * (end - start))
+                elif token == "/*":
+                    info.has_comment = True
+                    self.in_comment = True
+                    parts.append("  ")
+                else:
+                    # Keep the quotes so the literal still separates the code around it
+                    closed = len(token) > 1 and token[-1] == token[0]
+                    spans.append((start, end))
+                    parts.append(token[0] + " " * (len(token) - (2 if closed else 1)) + (token[0] if closed else ""))
+                pos = end
+            code = "".join(parts) + line[len(body):]
+            info.string_spans = spans
+
+        info.code = code
+        info.comment_only = info.has_comment and not code.strip()
+        info.directive = None
+        if code.lstrip().startswith("#"):
+            info.directive = self.directive_re.match(code).group(1)
+        info.opens = code.count("{")
+        info.closes = code.count("}")
+        return info
+
+class Profiler:
+    """Opt-in instrumentation filled in by BaseChecker: cumulative time and calls per
+    checker and per named rule (HorizontalSpaceChecker.spacing_rules,
+    BlocksChecker.block_starters), plus the slowest lines."""
+    def __init__(self, slowest_count=10):
+        self.checker_times = OrderedDict() # name -> [seconds, calls]
+        self.rule_times = OrderedDict()    # "Checker.rule" -> [seconds, calls]
+        self.slowest_lines = []            # heap of (seconds, line_count, file_name, start, checker spans)
+        self.slowest_count = slowest_count
+        self.file_name = None
+        self.start = time.perf_counter()
+
+    def add_checker(self, name, seconds):
+        entry = self.checker_times.get(name)
+        if entry is None:
+            entry = self.checker_times[name] = [0.0, 0]
+        entry[0] += seconds
+        entry[1] += 1
+
+    def add_rule(self, name, seconds):
+        entry = self.rule_times.get(name)
+        if entry is None:
+            entry = self.rule_times[name] = [0.0, 0]
+        entry[0] += seconds
+        entry[1] += 1
+
+    def add_line(self, line_count, start, seconds, spans):
+        import heapq
+        record = (seconds, line_count, self.file_name, start, spans)
+        if len(self.slowest_lines) < self.slowest_count:
+            heapq.heappush(self.slowest_lines, record)
+        elif seconds > self.slowest_lines[0][0]:
+            heapq.heapreplace(self.slowest_lines, record)
+
+    def table(self):
+        rows = ["%-52s %10s %12s %10s" % ("Checker", "calls", "total ms", "us/call")]
+        for title, times in (("", self.checker_times), ("Rule", self.rule_times)):
+            if title:
+                rows.append("")
+                rows.append("%-52s %10s %12s %10s" % (title, "calls", "total ms", "us/call"))
+            for name, (seconds, calls) in sorted(times.items(), key=lambda item: -item[1][0]):
+                rows.append("%-52s %10d %12.2f %10.2f" % (name, calls, seconds * 1e3, seconds / calls * 1e6))
+        rows.append("")
+        rows.append("Slowest lines")
+        for seconds, line_count, file_name, start, spans in sorted(self.slowest_lines, reverse=True):
+            slowest_checker = max(spans, key=lambda span: span[2])
+            rows.append((file_name + ":" if file_name else "Line ") + str(line_count) + ": %.3f ms (%s %.3f ms)"
+                        % (seconds * 1e3, slowest_checker[0], slowest_checker[2] * 1e3))
+        return "\n".join(rows)
+
+    def write_trace(self, trace_file_name):
+        """Writes a Chrome trace (chrome://tracing, Perfetto): the slowest lines with their
+        checkers on one track, cumulative time per checker and per rule on two others."""
+        events = []
+        for tid, track in ((1, "Slowest lines"), (2, "Cumulative per checker"), (3, "Cumulative per rule")):
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": track}})
+        for seconds, line_count, file_name, start, spans in self.slowest_lines:
+            events.append({"name": "Line " + str(line_count), "cat": "line", "ph": "X", "pid": 1, "tid": 1,
+                           "ts": (start - self.start) * 1e6, "dur": seconds * 1e6, "args": {"file": file_name}})
+            for name, span_start, span_seconds in spans:
+                events.append({"name": name, "cat": "checker", "ph": "X", "pid": 1, "tid": 1,
+                               "ts": (span_start - self.start) * 1e6, "dur": span_seconds * 1e6})
+        for tid, times in ((2, self.checker_times), (3, self.rule_times)):
+            offset = 0.0
+            for name, (seconds, calls) in times.items():
+                events.append({"name": name, "cat": "cumulative", "ph": "X", "pid": 1, "tid": tid,
+                               "ts": offset * 1e6, "dur": seconds * 1e6, "args": {"calls": calls}})
+                offset += seconds
+        with open(trace_file_name, "w") as trace_fd:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_fd)
 
 class BaseChecker:
-    def __init__(self, checkers):
+    def __init__(self, checkers, profiler=None):
         self.checkers = checkers
+        self.lexer = CLexer()
+        self.profiler = profiler
+        for checker in checkers:
+            if hasattr(checker, "profiler"):
+                checker.profiler = profiler
+        # Checkers still called on every line; check_styles drops the ones that are done
+        self.active_checkers = checkers
+        self.finished = [] # checkers whose check_styles returned True (done with the file)
+
+    def check_line(self, line, line_count, output):
+        stripped_line = line.strip()
+        line_info = self.lexer.scan(line)
+        for checker in self.active_checkers:
+            if checker.check_styles(line, stripped_line, line_count, output, line_info):
+                self.finished.append(checker)
+
+    def check_line_profiled(self, line, line_count, output):
+        # Same as check_line, with every step timed; only used when a Profiler is given
+        profiler = self.profiler
+        line_start = time.perf_counter()
+        stripped_line = line.strip()
+        line_info = self.lexer.scan(line)
+        start = time.perf_counter()
+        profiler.add_checker("CLexer", start - line_start)
+        spans = []
+        for checker in self.active_checkers:
+            if checker.check_styles(line, stripped_line, line_count, output, line_info):
+                self.finished.append(checker)
+            end = time.perf_counter()
+            profiler.add_checker(checker.__class__.__name__, end - start)
+            spans.append((checker.__class__.__name__, start, end - start))
+            start = end
+        if spans:
+            profiler.add_line(line_count, line_start, start - line_start, spans)
+
+    def check_context_line(self, line, line_count):
+        # A line outside the changed lines: only the checkers that keep state across lines
+        # see it, so that they are right on the changed lines, and their findings are dropped
+        stripped_line = line.strip()
+        line_info = self.lexer.scan(line)
+        for checker in self.context_checkers:
+            error_count = checker.error_count
+            if checker.check_styles(line, stripped_line, line_count, self.context_output, line_info):
+                self.finished.append(checker)
+            checker.error_count = error_count
+        for value_list in self.context_output.values():
+            del value_list[:]
 
-    def check_styles(self, user_fd, output, error_count):
+    def retire(self, line_count, output, changed_lines):
+        """Drops the checkers that are done or whose line_window ends at line_count from the
+        loop and finalizes them. Returns the line at which the next line_window ends."""
+        for checker in list(self.active_checkers):
+            if checker in self.finished or getattr(checker, "line_window", line_count + 1) <= line_count:
+                self.active_checkers.remove(checker)
+                if checker in self.context_checkers:
+                    self.context_checkers.remove(checker)
+                self.finalize(checker, line_count, output, changed_lines)
+        del self.finished[:]
+        windows = [checker.line_window for checker in self.active_checkers if hasattr(checker, "line_window")]
+        return min(windows) if windows else None
+
+    def finalize(self, checker, line_count, output, changed_lines):
+        # With changed_lines, findings about lines 1 - line_count only count if one of them changed
+        if changed_lines is None or any(changed_line <= line_count for changed_line in changed_lines):
+            checker.finalize(line_count, output)
+        else:
+            error_count = checker.error_count
+            checker.finalize(line_count, self.context_output)
+            checker.error_count = error_count
+
+    def check_styles(self, user_fd, output, error_count, changed_lines=None):
+        """Checks every line of user_fd. With changed_lines (a set of line numbers), findings
+        are only reported on those lines and stateless checkers skip all other lines.
+
+        Checkers with a line_window are dropped from the loop after that many lines, and
+        checkers whose check_styles returns True right away; either way (or at the end of
+        the file, whichever comes first) their finalize() is called once. Once every checker
+        has been dropped, the rest of the file is not read."""
+        # Choose once, so a run without profiler pays nothing for it
+        check_line = self.check_line if self.profiler is None else self.check_line_profiled
+        self.active_checkers = list(self.checkers)
+        self.context_checkers = [checker for checker in self.checkers if not getattr(checker, "stateless", False)]
+        self.context_output = OrderedDict((checker.__class__.__name__, []) for checker in self.checkers)
+        finished = self.finished = []
+        retire_at = self.retire(0, output, changed_lines)
         line_count = 0
         for line in user_fd:
+            if not self.active_checkers:
+                break # the context checkers are a subset, so nothing would look at the line
             line_count += 1
-            stripped_line = line.strip()
-            for checker in self.checkers:
-                checker.check_styles(line, stripped_line, line_count, output)
+            if changed_lines is None or line_count in changed_lines:
+                check_line(line, line_count, output)
+            else:
+                self.check_context_line(line, line_count)
+            if line_count == retire_at or finished:
+                retire_at = self.retire(line_count, output, changed_lines)
+        for checker in self.active_checkers:
+            self.finalize(checker, line_count, output, changed_lines)
+        self.active_checkers = self.checkers
         for checker in self.checkers:
             checker.count_errors(error_count)
 
 class NameCommentChecker:
+    line_window = 10
+
     def __init__(self):
         self.error_count = 0
         self.author_found = False
@@ -24,12 +330,12 @@ class NameCommentChecker:
         self.email_found = False
         self.comment_added = False
 
-    def check_styles(self, line, stripped_line, line_count, output):
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
         # Skip if past the first 10 lines  
-        if line_count > 10 or self.comment_added:
+        if line_count > self.line_window or self.comment_added:
             return
 
-        if "/*" in line or "//" in line:
+        if line_info.has_comment:
             self.comment_found = True
             
         if self.comment_found:
@@ -40,20 +346,22 @@ class NameCommentChecker:
 
         # Check for different cases
         if self.author_found and self.email_found and self.comment_found:
-            output["NameCommentChecker"].append("Line "+ str(line_count) + ": Name comment found")
+            output["NameCommentChecker"].append(Diagnostic("NameCommentChecker", "found", line_count, "Line {line}: Name comment found", severity="note"))
             self.comment_added = True
             return True
         if self.author_found and self.comment_found:
-            output["NameCommentChecker"].append("Line "+ str(line_count) + ": Name comment found, but email is missing")
+            output["NameCommentChecker"].append(Diagnostic("NameCommentChecker", "missing_email", line_count, "Line {line}: Name comment found, but email is missing"))
             self.comment_added = True
             return True
         if self.email_found and self.comment_found:
-            output["NameCommentChecker"].append("Line "+ str(line_count) + ": Name comment found, but did not include 'Author'")
+            output["NameCommentChecker"].append(Diagnostic("NameCommentChecker", "missing_author", line_count, "Line {line}: Name comment found, but did not include 'Author'"))
             self.comment_added = True
             return True
-        if line_count == 10 and self.author_found == False and self.email_found == False and self.comment_found == False:
-            output["NameCommentChecker"].append("In Lines 1 - 10: No name comment found")
         return False
+
+    def finalize(self, line_count, output):
+        if self.author_found == False and self.email_found == False and self.comment_found == False:
+            output["NameCommentChecker"].append(Diagnostic("NameCommentChecker", "missing", None, "In Lines 1 - 10: No name comment found"))
     
     def count_errors(self, error_count):
         if self.comment_added:
@@ -61,274 +369,448 @@ class NameCommentChecker:
         else:
             error_count["NameCommentChecker"].append("Name Comment Error: 1 Error - No Name Comment Found")
 
+    def snapshot(self):
+        return (self.author_found, self.comment_found, self.email_found, self.comment_added)
+
+    def restore(self, state):
+        self.author_found, self.comment_found, self.email_found, self.comment_added = state
+
 class NamingChecker:
-    def __init__(self):
+    # Keeps no state between lines, so it can be skipped on lines whose findings are not wanted
+    stateless = True
+    # Its rules are independent of each other and can be enabled one by one (see RuleSelection)
+    selectable_rules = True
+    rule_ids = ("struct_union_case", "function_case", "long_function_name", "single_letter")
+
+    def __init__(self, selection=None):
         self.error_count = 0
+        self.enabled_rules = frozenset(self.rule_ids) if selection is None else selection.enabled_rules("NamingChecker", self.rule_ids)
+        # The function name match is only needed for the rules about function names
+        self.function_rules = not self.enabled_rules.isdisjoint(("function_case", "long_function_name", "single_letter"))
 
-    def check_styles(self, line, stripped_line, line_count, output):
-        struct_union_match = re.match(r'\b(struct|union)\s+(\w+)', stripped_line)
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
+        if line_info.comment_only:
+            return
+        enabled_rules = self.enabled_rules
+        # The matches are on stripped_line; columns count from the start of line
+        indent = len(line) - len(line.lstrip())
+        struct_union_match = "struct_union_case" in enabled_rules and re.match(r'\b(struct|union)\s+(\w+)', stripped_line)
         if struct_union_match:
             struct_union_name = struct_union_match.group(2)
             if not struct_union_name[0].isupper() or "_" in struct_union_name:
-                output["NamingChecker"].append("Line " + str(line_count) + ": Struct/Union name " + struct_union_name + " should be in CamelCase \n" + stripped_line)
+                output["NamingChecker"].append(Diagnostic("NamingChecker", "struct_union_case", line_count, "Line {line}: Struct/Union name {name} should be in CamelCase \n{source}",
+                                                         column=indent + struct_union_match.start(2) + 1, name=struct_union_name, source=stripped_line))
                 self.error_count += 1
         
-        func_match = re.match(r'\w+\s+([a-zA-Z_]+)\(', stripped_line)
+        func_match = self.function_rules and re.match(r'\w+\s+([a-zA-Z_]+)\(', stripped_line)
         if func_match:
             func_name = func_match.group(1)
-            if not func_name.islower():
-                output["NamingChecker"].append("Line " + str(line_count) + ": Uppercase character found. Function name '" + func_name + "' should be in snake_case. \n" + stripped_line)
+            if not func_name.islower() and "function_case" in enabled_rules:
+                output["NamingChecker"].append(Diagnostic("NamingChecker", "function_case", line_count, "Line {line}: Uppercase character found. Function name '{name}' should be in snake_case. \n{source}",
+                                                         column=indent + func_match.start(1) + 1, name=func_name, source=stripped_line))
                 self.error_count += 1
 
-            if len(func_name) > 7:
+            if len(func_name) > 7 and "long_function_name" in enabled_rules:
                 if not "_" in func_name:
-                    output["NamingChecker"].append("Line" + str(line_count) + ": Long function name '" + func_name + "' with no underscore\nCheck if function name is really a single word that follows snake_case")
+                    output["NamingChecker"].append(Diagnostic("NamingChecker", "long_function_name", line_count, "Line{line}: Long function name '{name}' with no underscore\nCheck if function name is really a single word that follows snake_case",
+                                                             severity="warning", column=indent + func_match.start(1) + 1, name=func_name))
 
             # Check for single letter variables
-            if len(func_name) == 1 and func_name not in ['i', 'j', 'k', 'n', 'm']:
-                    output["NamingChecker"].append("Line " + line_count + ": Single-letter variable '" + func_name + "' should not be used.")
+            if len(func_name) == 1 and func_name not in ['i', 'j', 'k', 'n', 'm'] and "single_letter" in enabled_rules:
+                    output["NamingChecker"].append(Diagnostic("NamingChecker", "single_letter", line_count, "Line {line}: Single-letter variable '{name}' should not be used.",
+                                                             column=indent + func_match.start(1) + 1, name=func_name))
                     self.error_count += 1
 
 
+    def finalize(self, line_count, output):
+        pass
+
     def count_errors(self, error_count):   
         error_count["NamingChecker"].append("Total Naming Errors: " + str(self.error_count))
+
+    def snapshot(self):
+        return ()
+
+    def restore(self, state):
+        pass
    
 class LineLengthChecker:
-    def __init__(self):
+    max_length = 120
+    warning_length = 80
+    stateless = True
+    # max_length and warning_length can be enabled one by one (see RuleSelection); a
+    # line over max_length is never also reported by warning_length
+    selectable_rules = True
+    rule_ids = ("max_length", "warning_length")
+
+    def __init__(self, selection=None):
         self.error_count = 0
+        self.enabled_rules = frozenset(self.rule_ids) if selection is None else selection.enabled_rules("LineLengthChecker", self.rule_ids)
 
-    def check_styles(self, line, stripped_line, line_count, output):
-        if len(line) > 120:
-            output["LineLengthChecker"].append("Line " + str(line_count) + ": A single line should never exceed 120 characters in a line including indentation\n" + line.rstrip('\n'))
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
+        if len(line) > self.max_length:
+            if "max_length" not in self.enabled_rules:
+                return
+            output["LineLengthChecker"].append(Diagnostic("LineLengthChecker", "max_length", line_count, "Line {line}: A single line should never exceed {max_length} characters in a line including indentation\n{source}",
+                                                     column=self.max_length + 1, max_length=self.max_length, source=line.rstrip('\n')))
             self.error_count += 1
-        elif len(line) > 80:
-            output["LineLengthChecker"].append("Line " + str(line_count) + ": Not an error, but try to avoid overlong lines.\nKeep it less than 80 characters including indentation. " + str(len(line)) + " characters have been found in this line \n" + line.rstrip('\n'))
+        elif len(line) > self.warning_length and "warning_length" in self.enabled_rules:
+            output["LineLengthChecker"].append(Diagnostic("LineLengthChecker", "warning_length", line_count, "Line {line}: Not an error, but try to avoid overlong lines.\nKeep it less than {warning_length} characters including indentation. {length} characters have been found in this line \n{source}",
+                                                     severity="warning", column=self.warning_length + 1, warning_length=self.warning_length, length=len(line), source=line.rstrip('\n')))
+
+    def finalize(self, line_count, output):
+        pass
 
     def count_errors(self, error_count):
         error_count["LineLengthChecker"].append("Total Line Length Errors: " + str(self.error_count))
+
+    def snapshot(self):
+        return ()
+
+    def restore(self, state):
+        pass
         
 class IncludeDirectiveChecker:
+    line_window = 100
+
     def __init__(self):
         self.error_count = 0
         self.std_headers = []
         self.custom_headers = []
         self.state = "standard"
 
-    def check_styles(self, line, stripped_line, line_count, output):
-        if stripped_line == "" or line_count > 100:
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
+        if stripped_line == "" or line_count > self.line_window:
             return
-        if line_count == 100:
-            self.validate_order(output)
+        if line_info.directive != "include":
             return
         
-        if stripped_line.startswith("#include <") and self.state == "custom":
-            output["IncludeDirectiveChecker"].append("Line " + str(line_count) + ": Custom project headers should be after standard library headers")
+        header_start = line_info.code.split("include", 1)[1].lstrip()[:1]
+        if header_start == "<" and self.state == "custom":
+            output["IncludeDirectiveChecker"].append(Diagnostic("IncludeDirectiveChecker", "custom_before_std", line_count, "Line {line}: Custom project headers should be after standard library headers"))
             self.std_headers.append(stripped_line)
             self.state = "standard"
             self.error_count += 1
-        elif stripped_line.startswith("#include <"):
+        elif header_start == "<":
             self.std_headers.append(stripped_line)
             self.state = "standard"
-        elif stripped_line.startswith("#include \""):
+        elif header_start == "\"":
             self.custom_headers.append(stripped_line)
             self.state = "custom"
         
     def validate_order(self, output):
         if self.std_headers != sorted(self.std_headers):
-            output["IncludeDirectiveChecker"].append("Standard library headers are not in alphabetical order")
+            output["IncludeDirectiveChecker"].append(Diagnostic("IncludeDirectiveChecker", "std_order", None, "Standard library headers are not in alphabetical order"))
             self.error_count += 1
 
         if self.custom_headers != sorted(self.custom_headers):
-            output["IncludeDirectiveChecker"].append("Custom headers not in alphabetical order.")
+            output["IncludeDirectiveChecker"].append(Diagnostic("IncludeDirectiveChecker", "custom_order", None, "Custom headers not in alphabetical order."))
             self.error_count += 1
 
+    def finalize(self, line_count, output):
+        # After line_window lines or at the end of a shorter file
+        self.validate_order(output)
+
     def count_errors(self, error_count):
         error_count["IncludeDirectiveChecker"].append("Total Include Directive Errors: " + str(self.error_count))
 
+    def snapshot(self):
+        return (tuple(self.std_headers), tuple(self.custom_headers), self.state)
+
+    def restore(self, state):
+        self.std_headers = list(state[0])
+        self.custom_headers = list(state[1])
+        self.state = state[2]
+
 class IndentationChecker:
     def __init__(self):
         self.error_count = 0
         self.indentation_level = 0
-        self.in_multiline_comment = False
         self.switch_found = False
         self.case_found = False
 
-    def check_styles(self, line, stripped_line, line_count, output):
-        if stripped_line == "":
-            return
-        if stripped_line.startswith("/*"):
-            self.in_multiline_comment = True
-        if stripped_line.endswith("*/"):
-            self.in_multiline_comment = False
-            return
-        # Ignore lines within a comment block
-        if self.in_multiline_comment or stripped_line.startswith("//"):
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
+        # Ignore empty lines and lines that only hold a comment
+        if stripped_line == "" or line_info.comment_only:
             return
         
         # Do not change indent count inside a switch statement
-        if "switch" in stripped_line:
+        code = line_info.code
+        if "switch" in code:
             self.switch_found = True
-        elif self.switch_found and "case" in stripped_line:
+        elif self.switch_found and "case" in code:
             self.case_found = True
-        elif self.switch_found and "}" in stripped_line:
+        elif self.switch_found and line_info.closes:
             self.switch_found = False
             self.case_found = False
 
         cur_indentation = line[:len(line) - len(line.lstrip())]
-        if "}" in line:
+        if line_info.closes:
             expected_indentation = "    " * (self.indentation_level - 1)
         else:
             expected_indentation = "    " * self.indentation_level
 
-        if "{" in line:
+        if line_info.opens:
             self.indentation_level +=1
-        if "}" in line:
+        if line_info.closes:
             self.indentation_level -=1
 
         if "\t" in line:
             self.error_count += 1
-            output["IndentationChecker"].append("Line " + str(line_count) + ": Tab found\n" + line.rstrip('\n'))
+            output["IndentationChecker"].append(Diagnostic("IndentationChecker", "tab", line_count, "Line {line}: Tab found\n{source}",
+                                                      column=line.find("\t") + 1, source=line.rstrip('\n')))
             return
         
         if cur_indentation != expected_indentation:
             self.error_count += 1
-            output["IndentationChecker"].append("Line " + str(line_count) + ": Not 4 spaces or wrong indentation level.\n" + line.rstrip('\n'))
+            output["IndentationChecker"].append(Diagnostic("IndentationChecker", "indentation", line_count, "Line {line}: Not 4 spaces or wrong indentation level.\n{source}",
+                                                      column=1, source=line.rstrip('\n')))
+
+    def finalize(self, line_count, output):
+        pass
 
     def count_errors(self, error_count):
         error_count["IndentationChecker"].append("Total Indentation Errors: " + str(self.error_count))
 
+    def snapshot(self):
+        return (self.indentation_level, self.switch_found, self.case_found)
+
+    def restore(self, state):
+        self.indentation_level, self.switch_found, self.case_found = state
+
 class BlocksChecker:
+    # Pattern strings at class level, like HorizontalSpaceChecker's rule tables
+    block_starter_patterns = OrderedDict([
+        ("keyword",     r'\b(if|else|for|while|do|switch)\b'),
+        ("function",    r'\b(int|float|char|void|double|bool|long|short)\s+\w+\s*\(.*\)\s*{'),
+        ("declaration", r'\b(const\s+)?\b(int|float|char|void|double|bool|long|short)(\s+\*|\s*)\s+\w+(\s*\[\])?'),
+        ("enum_struct", r'\b(enum|struct)\s+\w+\s*{')
+    ])
+    typedef_regex = r'\btypedef\b\s+\w+\s+(\w+)'
+    # Functions returning a typedef'd type: every identifier that is followed by a
+    # name, a parameter list and "{" is looked up in typedef_names, so the cost
+    # does not grow with the number of typedefs
+    typedef_function_regex = r'\b(\w+)(?=\s+\w+\s*\(.*\)\s*{)'
+
     def __init__(self):
         self.error_count = 0
         self.std_headers = []
         self.custom_headers = []
-        self.block_starters = [
-            r'\b(if|else|for|while|do|switch)\b',
-            r'\b(int|float|char|void|double|bool|long|short)\s+\w+\s*\(.*\)\s*{',
-            r'\b(const\s+)?\b(int|float|char|void|double|bool|long|short)(\s+\*|\s*)\s+\w+(\s*\[\])?',
-            r'\b(enum|struct)\s+\w+\s*{'
-        ]
-
-    def check_styles(self, line, stripped_line, line_count, output):
-        if "typedef" in stripped_line:
-            match = re.search(r'\btypedef\b\s+\w+\s+(\w+)', stripped_line)
+        self.block_starters = OrderedDict((name, re.compile(pattern)) for name, pattern in self.block_starter_patterns.items())
+        self.typedef_pattern = re.compile(self.typedef_regex)
+        self.typedef_function = re.compile(self.typedef_function_regex)
+        self.typedef_names = set()
+        self.profiler = None
+
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
+        # Braces, typedefs and keywords inside comments and string literals do not count
+        code = line_info.code
+        stripped_code = code.strip()
+        if "typedef" in code:
+            match = self.typedef_pattern.search(stripped_code)
             if match:
-                custom_type = match.group(1)
-                custom_type_pattern = r'\b(' + custom_type + r')\s+\w+\s*\(.*\)\s*{'
-                self.block_starters.append(custom_type_pattern)
+                self.typedef_names.add(match.group(1))
 
-        elif "{" in stripped_line:
-            if stripped_line == "{":
-                output["BlocksChecker"].append("Line " + str(line_count) + ": Opening curly brace should not be on a separate line \n" + stripped_line)
+        elif line_info.opens:
+            if stripped_code == "{":
+                output["BlocksChecker"].append(Diagnostic("BlocksChecker", "brace_own_line", line_count, "Line {line}: Opening curly brace should not be on a separate line \n{source}",
+                                                         column=code.find("{") + 1, source=stripped_line))
                 self.error_count += 1
-            elif not any(re.search(pattern, line) for pattern in self.block_starters):
-                output["BlocksChecker"].append("Line " + str(line_count) + ": Suspicious block start: \n" + stripped_line)
+            elif not self.starts_block(code):
+                output["BlocksChecker"].append(Diagnostic("BlocksChecker", "suspicious_block", line_count, "Line {line}: Suspicious block start: \n{source}",
+                                                         column=code.find("{") + 1, source=stripped_line))
                 self.error_count += 1
                 
-            spacing_check = re.search(r'(\w|\))\s\{', stripped_line)
+            spacing_check = re.search(r'(\w|\))\s\{', stripped_code)
 
             if not spacing_check:
-                output["BlocksChecker"].append("Line " + str(line_count) + ": Opening curly brace should be preceded by one space \n" + stripped_line)
+                output["BlocksChecker"].append(Diagnostic("BlocksChecker", "brace_spacing", line_count, "Line {line}: Opening curly brace should be preceded by one space \n{source}",
+                                                         column=code.find("{") + 1, source=stripped_line))
                 self.error_count += 1
 
-        if "}" in stripped_line:
-            if not stripped_line.startswith("}") and not any(re.search(pattern, line) for pattern in self.block_starters):
-                output["BlocksChecker"].append("Line " + str(line_count) + ": Closing curly brace should be on a separate line \n" + stripped_line)
+        if line_info.closes:
+            if not stripped_code.startswith("}") and not self.starts_block(code):
+                output["BlocksChecker"].append(Diagnostic("BlocksChecker", "close_brace_line", line_count, "Line {line}: Closing curly brace should be on a separate line \n{source}",
+                                                         column=code.find("}") + 1, source=stripped_line))
                 self.error_count += 1
 
+    def starts_block(self, code):
+        profiler = self.profiler
+        for name, pattern in self.block_starters.items():
+            if profiler is None:
+                match = pattern.search(code)
+            else:
+                start = time.perf_counter()
+                match = pattern.search(code)
+                profiler.add_rule("BlocksChecker." + name, time.perf_counter() - start)
+            if match:
+                return True
+        if not self.typedef_names:
+            return False
+        if profiler is None:
+            return self.starts_typedef_function(code)
+        start = time.perf_counter()
+        found = self.starts_typedef_function(code)
+        profiler.add_rule("BlocksChecker.typedef_function", time.perf_counter() - start)
+        return found
+
+    def starts_typedef_function(self, code):
+        for match in self.typedef_function.finditer(code):
+            if match.group(1) in self.typedef_names:
+                return True
+        return False
+
+    def finalize(self, line_count, output):
+        pass
+
     def count_errors(self, error_count):   
         error_count["BlocksChecker"].append("Total Block Errors: " + str(self.error_count))
+
+    def snapshot(self):
+        return frozenset(self.typedef_names)
+
+    def restore(self, state):
+        self.typedef_names = set(state)
    
 class HorizontalSpaceChecker:
-    def __init__(self):
-        self.error_count = 0
-        self.word_or_num =   r'[\w\d]'
-        self.relational_op = r'((?<!<)<=|==|!=|(?<!>)>=|((?<!<)<(?!<)(?!=))|((?<!>)>(?!>)(?!=)))'
-        self.assignment_op = r'(\+=|-=|\*=|/=|%=|&=|\|=|\^=|~=|<<=|>>=|((?<!\+)(?<!-)(?<!\*)(?<!/)(?<!%)(?<!&)(?<!\|)(?<!\^)(?<!~)(?<!<)(?<!>)(?<!<)(?<!>)(?<!!)(?<!=)=(?!=)))'
-        self.arithmetic_op = r'(((?<!\+)\+(?!=)(?!\+))|((?<!\-)-(?!=)(?!-))|((?<!/)/(?!/)(?!=)))'
-        self.logical_op =   r'((\&\&)|(\|\|))'
-        self.bitwise_op =   r'((?<!\|)\|(?!\|)|\^(?!=)|<<(?!=)|>>(?!=))'
-        self.address_op =   r'(?<!&)&(?!&)'
-        self.start_exceptions = [
-            r'/\*', r'\*', r'#define', r'#include'
-        ]
-        self.other_exceptions = [
-            r'print\s*\(\s*["\'](.*)["\']\s*\)',  # Ignore all text in a print statement
-            r'printf\s*\(\s*["\'](.*)["\']\s*\)', # Ignore all text in a printf statement
-            r'scanf\s*\(\s*["\'](.*)["\']\s*\)'   # Ignore all text in a scan statement
-        ]
-        self.lr_spacing = {
-            # Check:            No space on either side | No space on left | No space of right
-            "relational":       r'(?<!\s)' + self.relational_op + r'(?!\s)|(?<!\s)' + self.relational_op + r'\s+|\s+' + self.relational_op + r'(?!\s)',
-            "assignment":       r'(?<!\s)' + self.assignment_op + r'(?!\s)|(?<!\s)' + self.assignment_op + r'\s+|\s+' + self.assignment_op + r'(?!\s)',
-            "arithmetic":       r'(?<!\s)' + self.arithmetic_op + r'(?!\s)|(?<!\s)' + self.arithmetic_op + r'\s+|\s+' + self.arithmetic_op + r'(?!\s)',
-            "logical":          r'(?<!\s)' + self.logical_op + r'(?!\s)|(?<!\s)' + self.logical_op + r'\s+|\s+' + self.logical_op + r'(?!\s)',
-            "bitwise":          r'(?<!\s)' + self.bitwise_op + r'(?!\s)|(?<!\s)' + self.bitwise_op + r'\s+|\s+' + self.bitwise_op + r'(?!\s)',
-            "address_bit":      r'(?<!\s)' + self.address_op + r'(?!\s)|(?<!\s)' + self.address_op + r'\s+',
-            "pointer":          r'(?<!\s)\*+(?!\s)|(?<!\s)\*+\s+|\s+\*+(?!\s)(?!=)',
-        }
-        self.over_spacing = {
-            # Check:            Two or more space on the right | Two or more space on the left
-            "relational":       r'[\w\d]\s{2,}' + re.escape(self.relational_op) + r'\s{2,}[\w\d]',
-            "assignment":       r'[\w\d]\s{2,}' + re.escape(self.assignment_op) + r'\s{2,}[\w\d]',
-            "arithmetic":       r'[\w\d]\s{2,}' + re.escape(self.arithmetic_op) + r'\s{2,}[\w\d]',
-            "logical":          r'[\w\d]\s{2,}(\&\&|\|\|)\s{2,}[\w\d]',
-            "bitwise":          r'[\w\d]\s{2,}' + re.escape(self.bitwise_op) + r'\s{2,}[\w\d]',
-            "conds_loops":      r'(if|else if|for|while|do)\s{2,}(\(|\{)',
-            "pointer":          r'(\s{2,}\*+\s*|\s*\*+\s{2,})'
-
-        }
-        self.other_rules = {
-            "logical_not":  r'!\s+\w',
-            "conds_loops":  r'(if|else if|for|while|do)(\(|\{)',
-            "unary_ops":    r'(?<![\w\d])(\~|\+\+|--)\s+[\w\d]', 
-            "inside_paren": r'[(\[]\s+|\s+[)\]]'
-        }
-        self.other_comment = {
-            "logical_not": "Too many spaces between unary operator ! (logical not) and its operand",
-            "conds_loops": "There should be a space between ",
-            "unary_ops":   "Never insert a space between a unary operator and its operand", 
-            "inside_paren": "Never insert a space immediately inside a parenthesis or square bracket"
-        }
-        self.spacing_rules = [self.lr_spacing, self.over_spacing, self.other_rules]
-
-    def check_styles(self, line, stripped_line, line_count, output):
-        for exception in self.start_exceptions:
-            if re.match(exception, stripped_line):
-                return
-        for exception in self.other_exceptions:
-            if re.search(exception, stripped_line):
-                return
+    stateless = True
+    # Its spacing rules can be enabled one by one (see RuleSelection)
+    selectable_rules = True
+
+    # The rule tables are class attributes, so that rules_fingerprint() can hash the
+    # pattern strings without building a checker and compiling them
+    word_or_num =   r'[\w\d]'
+    relational_op = r'((?<!<)<=|==|!=|(?<!>)>=|((?<!<)<(?!<)(?!=))|((?<!>)>(?!>)(?!=)))'
+    assignment_op = r'(\+=|-=|\*=|/=|%=|&=|\|=|\^=|~=|<<=|>>=|((?<!\+)(?<!-)(?<!\*)(?<!/)(?<!%)(?<!&)(?<!\|)(?<!\^)(?<!~)(?<!<)(?<!>)(?<!<)(?<!>)(?<!!)(?<!=)=(?!=)))'
+    arithmetic_op = r'(((?<!\+)\+(?!=)(?!\+))|((?<!\-)-(?!=)(?!-))|((?<!/)/(?!/)(?!=)))'
+    logical_op =   r'((\&\&)|(\|\|))'
+    bitwise_op =   r'((?<!\|)\|(?!\|)|\^(?!=)|<<(?!=)|>>(?!=))'
+    address_op =   r'(?<!&)&(?!&)'
+    # Comments and string literals are blanked out by CLexer, so only these need skipping
+    directive_exceptions = ("define", "include")
+    start_exceptions = ("*",) # pointer dereference at the start of a statement
+    lr_spacing = {
+        # Check:            No space on either side | No space on left | No space of right
+        "relational":       r'(?<!\s)' + relational_op + r'(?!\s)|(?<!\s)' + relational_op + r'\s+|\s+' + relational_op + r'(?!\s)',
+        "assignment":       r'(?<!\s)' + assignment_op + r'(?!\s)|(?<!\s)' + assignment_op + r'\s+|\s+' + assignment_op + r'(?!\s)',
+        "arithmetic":       r'(?<!\s)' + arithmetic_op + r'(?!\s)|(?<!\s)' + arithmetic_op + r'\s+|\s+' + arithmetic_op + r'(?!\s)',
+        "logical":          r'(?<!\s)' + logical_op + r'(?!\s)|(?<!\s)' + logical_op + r'\s+|\s+' + logical_op + r'(?!\s)',
+        "bitwise":          r'(?<!\s)' + bitwise_op + r'(?!\s)|(?<!\s)' + bitwise_op + r'\s+|\s+' + bitwise_op + r'(?!\s)',
+        "address_bit":      r'(?<!\s)' + address_op + r'(?!\s)|(?<!\s)' + address_op + r'\s+',
+        "pointer":          r'(?<!\s)\*+(?!\s)|(?<!\s)\*+\s+|\s+\*+(?!\s)(?!=)',
+    }
+    over_spacing = {
+        # Check:            Two or more space on the right | Two or more space on the left
+        "relational":       r'[\w\d]\s{2,}' + re.escape(relational_op) + r'\s{2,}[\w\d]',
+        "assignment":       r'[\w\d]\s{2,}' + re.escape(assignment_op) + r'\s{2,}[\w\d]',
+        "arithmetic":       r'[\w\d]\s{2,}' + re.escape(arithmetic_op) + r'\s{2,}[\w\d]',
+        "logical":          r'[\w\d]\s{2,}(\&\&|\|\|)\s{2,}[\w\d]',
+        "bitwise":          r'[\w\d]\s{2,}' + re.escape(bitwise_op) + r'\s{2,}[\w\d]',
+        "conds_loops":      r'(if|else if|for|while|do)\s{2,}(\(|\{)',
+        "pointer":          r'(\s{2,}\*+\s*|\s*\*+\s{2,})'
 
+    }
+    other_rules = {
+        "logical_not":  r'!\s+\w',
+        "conds_loops":  r'(if|else if|for|while|do)(\(|\{)',
+        "unary_ops":    r'(?<![\w\d])(\~|\+\+|--)\s+[\w\d]', 
+        "inside_paren": r'[(\[]\s+|\s+[)\]]'
+    }
+    other_comment = {
+        "logical_not": "Too many spaces between unary operator ! (logical not) and its operand",
+        "conds_loops": "There should be a space between ",
+        "unary_ops":   "Never insert a space between a unary operator and its operand", 
+        "inside_paren": "Never insert a space immediately inside a parenthesis or square bracket"
+    }
+    # Characters a line must contain for the rule to possibly match.
+    # Lines without any of them skip the regex search entirely.
+    rule_chars = {
+        "relational":   "<>=!",
+        "assignment":   "=",
+        "arithmetic":   "+-/",
+        "logical":      "&|",
+        "bitwise":      "|^<>",
+        "address_bit":  "&",
+        "pointer":      "*",
+        "conds_loops":  "({",
+        "logical_not":  "!",
+        "unary_ops":    "~+-",
+        "inside_paren": "()[]"
+    }
+    spacing_rules = [lr_spacing, over_spacing, other_rules]
+
+    spacing_rule_names = ["lr_spacing", "over_spacing", "other_rules"]
+    rule_ids = tuple(rule_name + "." + pattern_name for rule_name, rules in zip(spacing_rule_names, spacing_rules)
+                     for pattern_name in rules)
+
+    def __init__(self, selection=None):
+        self.error_count = 0
+        # Compile everything once instead of going through the re cache on every line.
+        # Rules that are not selected are never compiled
+        if selection is not None:
+            selection.check_rules("HorizontalSpaceChecker", self.rule_ids)
+        self.compiled_rules = []
         for i in range(len(self.spacing_rules)):
             for pattern_name, pattern in self.spacing_rules[i].items():
-                match = re.search(pattern, line)
-                if match:
-                    error_msg = "Line " + str(line_count) + ": "
-                    notify_fp = ""
-
-                    current_error = match.group(0).strip()
-                    stripped_error = current_error.strip()
-                    if stripped_error == "-":
-                        notify_fp += "\nCheck if error is a negative number. Could be a false positive."
-                    elif stripped_error == ">" or stripped_error == "<":
-                        notify_fp += "\nCheck if current error is a usage string. Could be a false positive."
-                    elif stripped_error == "*" or stripped_error == "/":
-                        notify_fp += "\nCheck if current error is an inline comment or type-cast. Could be a false positive."
-
-                    
-                    if i == 0: # self.spacing_rules[0] = self.lr_spacing
-                        error_msg += ("No space on one or both sides of " + current_error + notify_fp)
-                    elif i == 1: # self.spacing_rules[1] = self.over_spacing
-                        error_msg += ("Too many spaces before and after" + current_error + notify_fp)
-                    else: # self.spacing_rules[2] = self.other_rules
-                        error_msg += (self.other_comment[pattern_name] + current_error)
-                    output["HorizontalSpaceChecker"].append(error_msg + "\n" + stripped_line)
-                    self.error_count += 1
+                rule_id = self.spacing_rule_names[i] + "." + pattern_name
+                if selection is not None and not selection.rule_enabled("HorizontalSpaceChecker", rule_id):
+                    continue
+                if i == 0: # self.spacing_rules[0] = self.lr_spacing
+                    template = "Line {line}: No space on one or both sides of {operator}{hint}\n{source}"
+                elif i == 1: # self.spacing_rules[1] = self.over_spacing
+                    template = "Line {line}: Too many spaces before and after{operator}{hint}\n{source}"
+                else: # self.spacing_rules[2] = self.other_rules
+                    template = "Line {line}: " + self.other_comment[pattern_name] + "{operator}\n{source}"
+                self.compiled_rules.append((rule_id, re.compile(pattern), frozenset(self.rule_chars[pattern_name]), template))
+        self.operator_chars = frozenset().union(*[required_chars for rule_id, pattern, required_chars, template in self.compiled_rules])
+        self.profiler = None
+
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
+        code = line_info.code
+        if line_info.directive in self.directive_exceptions or code.lstrip().startswith(self.start_exceptions):
+            return
+        line_chars = frozenset(code)
+        if line_chars.isdisjoint(self.operator_chars):
+            return
+
+        profiler = self.profiler
+        for rule_id, pattern, required_chars, template in self.compiled_rules:
+            if line_chars.isdisjoint(required_chars):
+                continue
+            if profiler is None:
+                match = pattern.search(code)
+            else:
+                start = time.perf_counter()
+                match = pattern.search(code)
+                profiler.add_rule("HorizontalSpaceChecker." + rule_id, time.perf_counter() - start)
+            if match:
+                matched = match.group(0)
+                current_error = matched.strip()
+                notify_fp = ""
+                if current_error == "-":
+                    notify_fp = "\nCheck if error is a negative number. Could be a false positive."
+                elif current_error == ">" or current_error == "<":
+                    notify_fp = "\nCheck if current error is a usage string. Could be a false positive."
+                elif current_error == "*" or current_error == "/":
+                    notify_fp = "\nCheck if current error is an inline comment or type-cast. Could be a false positive."
+
+                column = match.start() + len(matched) - len(matched.lstrip()) + 1
+                output["HorizontalSpaceChecker"].append(Diagnostic("HorizontalSpaceChecker", rule_id, line_count, template, column=column,
+                                                                   operator=current_error, hint=notify_fp, source=stripped_line))
+                self.error_count += 1
                 
+    def finalize(self, line_count, output):
+        pass
+
     def count_errors(self, error_count):  
         error_count["HorizontalSpaceChecker"].append("Total Horizontal Spacing Errors: " + str(self.error_count))
 
+    def snapshot(self):
+        return ()
+
+    def restore(self, state):
+        pass
+
 class VerticalSpaceChecker:
     def __init__(self):
         self.error_count = 0
@@ -336,106 +818,1443 @@ class VerticalSpaceChecker:
         self.newline_count = 0
         self.last_line = None
 
-    def check_styles(self, line, stripped_line, line_count, output):
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
         if stripped_line == "":
             self.newline_count += 1
             self.last_line_type = None
         else:
-            if re.match(r'^#include', stripped_line):
+            if line_info.directive == "include":
                 if self.last_line_type == "#include" and self.newline_count > 0:
-                    output["VerticalSpaceChecker"].append("Line " + str(line_count-1) + ": Possible error. Check if directives are split by group.\nIncludes directive of the same group should not be separated with a new line. \n" + self.last_line)
+                    output["VerticalSpaceChecker"].append(Diagnostic("VerticalSpaceChecker", "include_group_split", line_count - 1, "Line {line}: Possible error. Check if directives are split by group.\nIncludes directive of the same group should not be separated with a new line. \n{source}",
+                                                                     severity="warning", source=self.last_line))
                 self.last_line_type = "#include"
 
-            elif re.match(r'^#define', stripped_line):
+            elif line_info.directive == "define":
                 if self.last_line_type == "#include" and self.newline_count != 1:
-                    output["VerticalSpaceChecker"].append("Line" + str(line_count) + ": There should be one vertical space (newline) between the last #include and first #define \n" + self.last_line)
+                    output["VerticalSpaceChecker"].append(Diagnostic("VerticalSpaceChecker", "define_after_include", line_count, "Line{line}: There should be one vertical space (newline) between the last #include and first #define \n{source}",
+                                                                     source=self.last_line))
                 self.last_line_type = "#define"
             elif self.last_line_type == "#define" and not re.match(r'(^#define|\n|"")', stripped_line):
-                output["VerticalSpaceChecker"].append("Line" + str(line_count) + ": There should be one vertical space (newline) after the last #define \n" + self.last_line)
+                output["VerticalSpaceChecker"].append(Diagnostic("VerticalSpaceChecker", "define_block_end", line_count, "Line{line}: There should be one vertical space (newline) after the last #define \n{source}",
+                                                                 source=self.last_line))
                 self.last_line_type = None
             self.newline_count = 0
 
         self.last_line = stripped_line
             
+    def finalize(self, line_count, output):
+        pass
+
     def count_errors(self, error_count):  
         error_count["VerticalSpaceChecker"].append("Total Vertical Spacing Errors: " + str(self.error_count))
 
-def file_checker(file_name):
-    # Check file type
-    if file_name[-2:] != ".c":
-        raise ValueError("Please enter a .c file!")
+    def snapshot(self):
+        return (self.last_line_type, self.newline_count, self.last_line)
+
+    def restore(self, state):
+        self.last_line_type, self.newline_count, self.last_line = state
+
+class ProjectChecker:
+    """Checks a file against the ProjectIndex of its source tree: project headers that
+    do not exist, includes in another order than the other files of the directory use,
+    functions defined in more than one file, functions defined without including the
+    header that declares them, and function names that do not match the header
+    declarations (a naming variant, or another prefix than the header's others).
+
+    The include order policy of a directory is the order most of its files use: a
+    header included after another one is reported when at least min_order_files other
+    files of the directory include both and more of them put it first than last."""
+    min_order_files = 2
+
+    def __init__(self, project_index, file_name):
+        self.error_count = 0
+        self.project_index = project_index
+        self.path = project_index.relative_path(file_name)
+        self.directory_order = project_index.include_order(self.path)
+        self.included = set() # project headers included so far
+        self.include_keys = [] # every header included so far, in order
+
+    def check_order(self, line, line_count, output, match):
+        key = include_key(match.group(1), match.group(2))
+        if key in self.include_keys:
+            return
+        for earlier in self.include_keys:
+            first = self.directory_order.get((key, earlier), 0)
+            if first >= self.min_order_files and first > self.directory_order.get((earlier, key), 0):
+                output["ProjectChecker"].append(Diagnostic("ProjectChecker", "include_order", line_count, "Line {line}: {header} should be included before {other}, as most files in {directory} do",
+                                                          column=match.start(2) + 1, header=key, other=earlier,
+                                                          directory=os.path.dirname(self.path) or "."))
+                self.error_count += 1
+                break
+        self.include_keys.append(key)
+
+    def check_styles(self, line, stripped_line, line_count, output, line_info):
+        if line_info.directive == "include":
+            match = include_re.match(line)
+            if match:
+                self.check_order(line, line_count, output, match)
+            if match and match.group(1) == "\"":
+                header = self.project_index.resolve_header(self.path, match.group(2))
+                if header is None:
+                    output["ProjectChecker"].append(Diagnostic("ProjectChecker", "unknown_header", line_count, "Line {line}: Header {header} is not part of the project",
+                                                              column=match.start(2) + 1, header=match.group(2)))
+                    self.error_count += 1
+                else:
+                    self.included.add(header)
+            return
+        signature = parse_signature(line_info.code)
+        if signature is None or signature[2] != "definition" or signature[1]:
+            return
+        name = signature[0]
+        column = signature[3]
+        for path, other_line in self.project_index.definitions.get(name, ()):
+            if path != self.path:
+                output["ProjectChecker"].append(Diagnostic("ProjectChecker", "duplicate_definition", line_count, "Line {line}: Function {name} is also defined in {other}:{other_line}",
+                                                          column=column, name=name, other=path, other_line=other_line))
+                self.error_count += 1
+                break
+        headers = self.project_index.declarations.get(name)
+        if headers:
+            if not self.included.intersection(headers):
+                output["ProjectChecker"].append(Diagnostic("ProjectChecker", "missing_declaring_header", line_count, "Line {line}: Function {name} is declared in {header}, which is not included",
+                                                          column=column, name=name, header=headers[0]))
+                self.error_count += 1
+            prefix = self.project_index.header_prefixes.get(headers[0])
+            if prefix and not name.startswith(prefix + "_"):
+                output["ProjectChecker"].append(Diagnostic("ProjectChecker", "inconsistent_prefix", line_count, "Line {line}: Function {name} does not start with {prefix}_ like the other functions declared in {header}",
+                                                          column=column, name=name, prefix=prefix, header=headers[0]))
+                self.error_count += 1
+        else:
+            for declared_name in self.project_index.name_variants.get(name.replace("_", "").lower(), ()):
+                output["ProjectChecker"].append(Diagnostic("ProjectChecker", "declaration_mismatch", line_count, "Line {line}: Function {name} is not declared in any header, but {header} declares {declared_name}",
+                                                          column=column, name=name, declared_name=declared_name,
+                                                          header=self.project_index.declarations[declared_name][0]))
+                self.error_count += 1
+                break
+
+    def finalize(self, line_count, output):
+        pass
+
+    def count_errors(self, error_count):
+        error_count["ProjectChecker"].append("Total Project Errors: " + str(self.error_count))
+
+    def snapshot(self):
+        return (frozenset(self.included), tuple(self.include_keys))
+
+    def restore(self, state):
+        self.included = set(state[0])
+        self.include_keys = list(state[1])
+
+class SourceReader:
+    """Reads a source file for checking, opening it only once.
+
+    Small files are read in one call, files of mmap_threshold bytes or more are
+    memory-mapped. The raw bytes (data) are what the cache hashes; lines() yields
+    the decoded lines with line endings normalised to "\n", like text mode does.
+    Lines are decoded as UTF-8 (a UTF-8 BOM is dropped, UTF-16 with a BOM is decoded
+    as a whole); lines that are not valid UTF-8 fall back to Latin-1, which maps
+    every byte to one character, so files with stray bytes or in a legacy encoding
+    are checked instead of crashing the run and columns stay right."""
+    mmap_threshold = 16 * 1024 * 1024
+
+    def __init__(self, file_name):
+        self.mapping = None
+        try:
+            with open(file_name, "rb") as source_fd:
+                size = os.fstat(source_fd.fileno()).st_size
+                if size >= self.mmap_threshold:
+                    import mmap
+                    self.mapping = mmap.mmap(source_fd.fileno(), 0, access=mmap.ACCESS_READ)
+                    self.data = self.mapping
+                else:
+                    self.data = source_fd.read()
+        except (IOError, OSError, ValueError):
+            raise ValueError("File not found")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.mapping is not None:
+            self.mapping.close()
+            self.mapping = None
+
+    def lines(self):
+        head = self.data[:4]
+        if head.startswith(b"\xff\xfe") or head.startswith(b"\xfe\xff"):
+            text = bytes(self.data).decode("utf-16", "replace")
+            for line in io.StringIO(text, newline=None):
+                yield line
+            return
+        if isinstance(self.data, bytes):
+            raw_lines = iter(io.BytesIO(self.data).readline, b"")
+        else:
+            self.data.seek(0)
+            raw_lines = iter(self.data.readline, b"")
+        first = True
+        for raw_line in raw_lines:
+            if first:
+                first = False
+                if raw_line.startswith(b"\xef\xbb\xbf"):
+                    raw_line = raw_line[3:]
+            if b"\r" in raw_line:
+                # \r\n and lone \r end lines too, as in text mode
+                raw_line = raw_line.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+                for part in raw_line.splitlines(True):
+                    yield self.decode(part)
+            else:
+                yield self.decode(raw_line)
+
+    def decode(self, raw_line):
+        try:
+            return raw_line.decode("utf-8")
+        except UnicodeDecodeError:
+            return raw_line.decode("latin-1")
+
+_rules_fingerprint = None
+
+def rules_fingerprint():
+    """Hash of everything that decides what a report contains: the regex strings of
+    HorizontalSpaceChecker/BlocksChecker, the LineLengthChecker thresholds and the
+    checker code itself. Any change invalidates cached results. Only class attributes
+    are read, so no checker is built and no regex compiled."""
+    global _rules_fingerprint
+    if _rules_fingerprint is None:
+        rules = [HorizontalSpaceChecker.directive_exceptions, HorizontalSpaceChecker.start_exceptions,
+                 HorizontalSpaceChecker.spacing_rules, HorizontalSpaceChecker.other_comment,
+                 BlocksChecker.block_starter_patterns, BlocksChecker.typedef_regex, BlocksChecker.typedef_function_regex,
+                 LineLengthChecker.max_length, LineLengthChecker.warning_length]
+        import hashlib
+        digest = hashlib.sha256(repr(rules).encode("utf-8"))
+        with open(os.path.abspath(__file__), "rb") as source_fd:
+            digest.update(source_fd.read())
+        _rules_fingerprint = digest.hexdigest()
+    return _rules_fingerprint
+
+class ResultCache:
+    """On-disk cache of check results keyed by the file contents and the rule set.
+
+    Every entry is its own file, written to a temporary file and renamed into
+    place, so several processes can share one cache directory without locking.
+    Hits refresh the entry's mtime, and evict() drops the least recently used
+    entries once the directory grows beyond max_size bytes."""
+    def __init__(self, cache_dir, max_size=100 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, data, changed_lines=None, selection=None, project_index=None):
+        import hashlib
+        digest = hashlib.sha256(rules_fingerprint().encode("utf-8"))
+        digest.update(data)
+        if changed_lines is not None:
+            digest.update(repr(sorted(changed_lines)).encode("utf-8"))
+        if selection is not None:
+            digest.update(repr((selection.select, selection.ignore)).encode("utf-8"))
+        if project_index is not None:
+            # Project findings depend on every file of the tree
+            digest.update((project_index.root + "\0" + project_index.digest).encode("utf-8"))
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def load(self, key, output, error_count):
+        """Replays a cached result into output/error_count. Returns the cached
+        per-checker totals, or None on a miss."""
+        path = self.entry_path(key)
+        try:
+            with open(path, "r") as entry_fd:
+                header = json.loads(entry_fd.readline())
+                for checker_name in output:
+                    output[checker_name].clear()
+                for entry_line in entry_fd:
+                    checker_name, item = json.loads(entry_line)
+                    output[checker_name].append(decode_item(item))
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            # Start over from empty buffers in case a broken entry was partly replayed
+            close_output(output)
+            output.update(new_output(list(output)))
+            return None
+
+        for checker_name, value_list in header["error_count"]:
+            error_count[checker_name].extend(value_list)
+        return OrderedDict(header["totals"])
+
+    def store(self, key, output, error_count, totals):
+        import tempfile
+        header = {"error_count": list(error_count.items()), "totals": list(totals.items())}
+        entry_fd = tempfile.NamedTemporaryFile("w", dir=self.cache_dir, suffix=".tmp", delete=False)
+        try:
+            with entry_fd:
+                entry_fd.write(json.dumps(header) + "\n")
+                for checker_name, value_list in output.items():
+                    for item in value_list:
+                        entry_fd.write(json.dumps([checker_name, encode_item(item)]) + "\n")
+            os.replace(entry_fd.name, self.entry_path(key))
+        except (IOError, OSError):
+            # A failed cache write must never fail the check itself
+            try:
+                os.remove(entry_fd.name)
+            except OSError:
+                pass
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
 
-    # Check if file exists
+        entries.sort()
+        for mtime, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass # already evicted by another process
+            total_size -= size
+
+include_re = re.compile(r'\s*#\s*include\s*([<"])([^>"]+)[>"]')
+
+def include_key(delimiter, header):
+    # <stdio.h> and "stdio.h" are different headers
+    return "<" + header + ">" if delimiter == "<" else "\"" + header + "\""
+# A function signature at the start of a line: return type words/pointers, the name, "("
+signature_re = re.compile(r'(static\s+)?(?:[A-Za-z_]\w*[\s\*]+)+?\**([A-Za-z_]\w*)\s*\(')
+not_signatures = frozenset(["if", "for", "while", "switch", "return", "sizeof", "else", "do", "typedef"])
+
+def parse_signature(code):
+    """Returns (name, is_static, "definition" or "declaration", column of the name) for a
+    line of code that starts a function definition or declaration at the top level, None
+    for any other line."""
+    if not code[:1].isalpha() and code[:1] != "_":
+        return None
+    match = signature_re.match(code)
+    if match is None or match.group(2) in not_signatures or code.split(None, 1)[0] in not_signatures:
+        return None
+    rest = code.rstrip()
+    if rest.endswith(";"):
+        return match.group(2), bool(match.group(1)), "declaration", match.start(2) + 1
+    if rest.endswith(","):
+        return None # parameters continue on the next line
+    return match.group(2), bool(match.group(1)), "definition", match.start(2) + 1
+
+def index_source(root, path, old_entry=None):
+    """Reads one source file of a project and returns its ProjectIndex entry (without mtime).
+    When the contents hash is still that of old_entry, old_entry is returned unparsed."""
     try:
-      with open(file_name, "r") as user_fd:
-          pass
-    except Exception as e:
-        raise ValueError("File not found")
-    
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python style_checker.py <file_name.c>")
-        return
-    
-    file_name = sys.argv[1].strip()
+        source = SourceReader(os.path.join(root, path))
+    except ValueError:
+        return None
+    try:
+        import hashlib
+        digest = hashlib.sha256()
+        digest.update(source.data)
+        if old_entry is not None and old_entry["hash"] == digest.hexdigest():
+            return old_entry # touched but not changed, e.g. by a checkout
+        entry = {"size": len(source.data), "hash": digest.hexdigest(), "includes": [], "declarations": [], "definitions": []}
+        lexer = CLexer()
+        line_count = 0
+        for line in source.lines():
+            line_count += 1
+            line_info = lexer.scan(line)
+            if line_info.directive == "include":
+                match = include_re.match(line)
+                if match:
+                    entry["includes"].append([line_count, match.group(2), match.group(1)])
+                continue
+            signature = parse_signature(line_info.code)
+            if signature is None:
+                continue
+            name, is_static, kind, column = signature
+            if kind == "declaration" or path.endswith(".h"):
+                if path.endswith(".h"):
+                    entry["declarations"].append([line_count, name])
+            elif not is_static:
+                entry["definitions"].append([line_count, name])
+        return entry
+    finally:
+        source.close()
+
+class ProjectIndex:
+    """Includes, header function declarations and function definitions of every .c/.h
+    file in a source tree, for checks across files (ProjectChecker). The includes give
+    each directory's include order: for every two headers, how many of its files
+    include one before the other.
+
+    The index is kept in index_file (JSON) between runs. update() only reads files whose
+    mtime or size changed, and of those only parses the ones whose contents hash changed
+    too; the files to read are spread across a process pool."""
+    version = 3
+
+    def __init__(self, root, index_file=None):
+        self.root = os.path.abspath(root)
+        self.index_file = index_file or os.path.join(self.root, ".style_checker_index.json")
+        self.files = {} # path relative to root -> entry
+        self.read_files = 0
+        self.parsed_files = 0
+        try:
+            with open(self.index_file, "r") as index_fd:
+                stored = json.load(index_fd)
+            if stored.get("version") == self.version:
+                self.files = stored["files"]
+        except (IOError, OSError, ValueError):
+            pass # no usable index yet, build it from scratch
+        self.build_lookups()
+
+    def relative_path(self, file_name):
+        return os.path.relpath(os.path.abspath(file_name), self.root)
+
+    def source_files(self):
+        paths = []
+        for dir_path, dir_names, dir_files in os.walk(self.root):
+            dir_names[:] = sorted(name for name in dir_names if not name.startswith("."))
+            for name in sorted(dir_files):
+                if name.endswith(".c") or name.endswith(".h"):
+                    paths.append(os.path.relpath(os.path.join(dir_path, name), self.root))
+        return paths
+
+    def update(self, jobs=1):
+        """Brings the index up to date with the tree and saves it. Returns whether anything changed."""
+        files = {}
+        stale = []
+        for path in self.source_files():
+            try:
+                stat = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue
+            entry = self.files.get(path)
+            if entry is not None and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                files[path] = entry
+            else:
+                stale.append((path, stat.st_mtime_ns))
+        self.read_files = len(stale)
+
+        paths = [path for path, mtime in stale]
+        old_entries = [self.files.get(path) for path in paths]
+        if jobs <= 1 or len(paths) <= 1:
+            entries = [index_source(self.root, path, old_entry) for path, old_entry in zip(paths, old_entries)]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                entries = list(executor.map(index_source, [self.root] * len(paths), paths, old_entries,
+                                            chunksize=max(1, len(paths) // (jobs * 4))))
+        self.parsed_files = 0
+        for (path, mtime), entry in zip(stale, entries):
+            if entry is None:
+                continue
+            old_entry = self.files.get(path)
+            if old_entry is None or old_entry["hash"] != entry["hash"]:
+                self.parsed_files += 1
+            entry["mtime"] = mtime
+            files[path] = entry
+
+        changed = self.parsed_files > 0 or set(files) != set(self.files)
+        self.files = files
+        self.build_lookups()
+        if changed or self.read_files:
+            self.save()
+        return changed
+
+    def save(self):
+        import tempfile
+        index_dir = os.path.dirname(self.index_file) or "."
+        index_fd = tempfile.NamedTemporaryFile("w", dir=index_dir, suffix=".tmp", delete=False)
+        try:
+            with index_fd:
+                json.dump({"version": self.version, "files": self.files}, index_fd, separators=(",", ":"))
+            os.replace(index_fd.name, self.index_file)
+        except (IOError, OSError):
+            # The index is rebuilt next time; a failed write must not fail the check
+            try:
+                os.remove(index_fd.name)
+            except OSError:
+                pass
+
+    def build_lookups(self):
+        self.headers = {}       # header file name -> paths of the headers with that name
+        self.declarations = {}  # function name -> headers that declare it
+        self.definitions = {}   # function name -> [(path, line)] of its non-static definitions
+        self.name_variants = {} # function name without "_", lower case -> declared names
+        self.header_prefixes = {}
+        self.include_orders = {} # directory -> {(first, second): files including first before second}
+        import hashlib
+        digest = hashlib.sha256()
+        for path in sorted(self.files):
+            entry = self.files[path]
+            digest.update((path + "\0" + entry["hash"] + "\0").encode("utf-8"))
+            if path.endswith(".h"):
+                self.headers.setdefault(os.path.basename(path), []).append(path)
+                names = []
+                for line_count, name in entry["declarations"]:
+                    self.declarations.setdefault(name, []).append(path)
+                    self.name_variants.setdefault(name.replace("_", "").lower(), []).append(name)
+                    names.append(name)
+                self.header_prefixes[path] = self.common_prefix(names)
+            for line_count, name in entry["definitions"]:
+                self.definitions.setdefault(name, []).append((path, line_count))
+            self.count_include_order(self.include_orders.setdefault(os.path.dirname(path), {}), entry["includes"], 1)
+        self.digest = digest.hexdigest()
+
+    def count_include_order(self, counts, includes, step):
+        keys = []
+        for line_count, header, delimiter in includes:
+            key = include_key(delimiter, header)
+            if key not in keys:
+                keys.append(key)
+        for i in range(len(keys)):
+            for second in keys[i + 1:]:
+                counts[(keys[i], second)] = counts.get((keys[i], second), 0) + step
+
+    def include_order(self, path):
+        """The include order of the other files in path's directory (the file itself,
+        as indexed, is taken out so that it does not vote for its own order)."""
+        counts = dict(self.include_orders.get(os.path.dirname(path), {}))
+        entry = self.files.get(path)
+        if entry is not None:
+            self.count_include_order(counts, entry["includes"], -1)
+        return counts
+
+    def common_prefix(self, names):
+        # The prefix before the first "_" that at least 3 names and two thirds of all share
+        prefixes = {}
+        for name in set(names):
+            if "_" in name.strip("_"):
+                prefix = name.split("_", 1)[0]
+                prefixes[prefix] = prefixes.get(prefix, 0) + 1
+        for prefix, count in prefixes.items():
+            if count >= 3 and count * 3 >= len(set(names)) * 2:
+                return prefix
+        return None
+
+    def resolve_header(self, path, header):
+        # "header.h" is looked up next to the including file, then anywhere in the tree
+        candidate = os.path.normpath(os.path.join(os.path.dirname(path), header))
+        if candidate in self.files:
+            return candidate
+        paths = self.headers.get(os.path.basename(header))
+        return paths[0] if paths else None
+
+# Checker name -> class, in the order the checkers run and appear in the reports
+checker_registry = OrderedDict([("NameCommentChecker", NameCommentChecker),
+                                ("IncludeDirectiveChecker", IncludeDirectiveChecker),
+                                ("NamingChecker", NamingChecker),
+                                ("BlocksChecker", BlocksChecker),
+                                ("LineLengthChecker", LineLengthChecker),
+                                ("HorizontalSpaceChecker", HorizontalSpaceChecker),
+                                ("VerticalSpaceChecker", VerticalSpaceChecker),
+                                ("IndentationChecker", IndentationChecker)])
+
+class RuleSelection:
+    """Which checkers and rules run, from --select/--ignore or a config file.
+
+    Selectors are checker names (LineLengthChecker) or, for checkers whose rules can
+    be chosen one by one (HorizontalSpaceChecker, NamingChecker, LineLengthChecker),
+    rule ids below them (HorizontalSpaceChecker.lr_spacing,
+    HorizontalSpaceChecker.lr_spacing.relational or NamingChecker.function_case). With no select, everything is
+    selected. When both a select and an ignore selector match a rule, the more
+    specific one wins: --select HorizontalSpaceChecker --ignore HorizontalSpaceChecker.over_spacing
+    runs every spacing rule except the over_spacing ones."""
+    def __init__(self, select=(), ignore=()):
+        self.select = tuple(select)
+        self.ignore = tuple(ignore)
+        for selector in self.select + self.ignore:
+            checker_name, _, rule_id = selector.partition(".")
+            if checker_name not in checker_registry:
+                raise ValueError("Unknown checker in rule selection: " + selector)
+            if rule_id and not getattr(checker_registry[checker_name], "selectable_rules", False):
+                raise ValueError("The rules of " + checker_name + " cannot be selected one by one: " + selector)
+        # Unknown rule ids are found from the class-level rule_ids, without building checkers
+        for checker_name, checker_class in checker_registry.items():
+            if getattr(checker_class, "selectable_rules", False):
+                self.check_rules(checker_name, checker_class.rule_ids)
+
+    def longest_match(self, selectors, name):
+        lengths = [len(selector) for selector in selectors if name == selector or name.startswith(selector + ".")]
+        return max(lengths) if lengths else -1
+
+    def rule_enabled(self, checker_name, rule_id=None):
+        name = checker_name if rule_id is None else checker_name + "." + rule_id
+        selected = self.longest_match(self.select, name) if self.select else 0
+        return selected >= 0 and selected > self.longest_match(self.ignore, name)
+
+    def checker_enabled(self, checker_name):
+        # A checker runs if it or any of its rules is selected and it is not ignored as a whole
+        if self.longest_match(self.ignore, checker_name) >= 0 and \
+           not [selector for selector in self.select if selector.startswith(checker_name + ".")]:
+            return False
+        return not self.select or [selector for selector in self.select
+                                   if selector == checker_name or selector.startswith(checker_name + ".")] != []
+
+    def check_rules(self, checker_name, rule_ids):
+        for selector in self.select + self.ignore:
+            if selector.startswith(checker_name + ".") and not \
+               [rule_id for rule_id in rule_ids if self.longest_match([selector], checker_name + "." + rule_id) >= 0]:
+                raise ValueError("Unknown rule in rule selection: " + selector)
+
+    def enabled_rules(self, checker_name, rule_ids):
+        self.check_rules(checker_name, rule_ids)
+        return frozenset(rule_id for rule_id in rule_ids if self.rule_enabled(checker_name, rule_id))
 
+    def checker_names(self):
+        return [checker_name for checker_name in checker_registry if self.checker_enabled(checker_name)]
+
+def load_selection(config_file=None, select=None, ignore=None):
+    """Builds a RuleSelection from the [style_checker] section of a config file (select and
+    ignore, comma separated) and the command line, which takes precedence. A config file
+    that cannot be parsed raises ValueError."""
+    import configparser
+    config = configparser.ConfigParser()
+    def selectors(option, value):
+        if value is None:
+            value = config.get("style_checker", option, fallback="")
+        return [selector.strip() for selector in value.split(",") if selector.strip()]
     try:
-        file_checker(file_name)
-        out_file_name = file_name[:-2] + "_style_info.txt"
-
-        # clear contents of out_file before appending info
-        open(out_file_name, 'w').close()
-        out_fd = open(out_file_name, "a")
-        output = OrderedDict([("NameCommentChecker", []), 
-                              ("IncludeDirectiveChecker", []), 
-                              ("NamingChecker", []), 
-                              ("BlocksChecker", []), 
-                              ("LineLengthChecker", ["Ignore if 80+ char error is caused by a necessary function declaration etc.",]), 
-                              ("HorizontalSpaceChecker", []), 
-                              ("VerticalSpaceChecker", []), 
-                              ("IndentationChecker", [])])
-        
-        error_count = OrderedDict([("NameCommentChecker", []),
-                                   ("IncludeDirectiveChecker", []), 
-                                   ("NamingChecker", []),
-                                   ("BlocksChecker", []), 
-                                   ("LineLengthChecker", []), 
-                                   ("HorizontalSpaceChecker", []), 
-                                   ("VerticalSpaceChecker", []), 
-                                   ("IndentationChecker", [])])
-
-        name_comment_checker = NameCommentChecker()
-        include_directive_checker = IncludeDirectiveChecker()
-        naming_checker = NamingChecker()
-        blocks_checker = BlocksChecker()
-        line_length_checker = LineLengthChecker()
-        horizontal_space_checker = HorizontalSpaceChecker()
-        vertical_space_checker = VerticalSpaceChecker()
-        indentation_checker = IndentationChecker()
+        if config_file is not None and not config.read(config_file):
+            raise ValueError("Config file not found: " + config_file)
+        return RuleSelection(selectors("select", select), selectors("ignore", ignore))
+    except configparser.Error as e:
+        raise ValueError(str(e))
+
+def make_checkers(selection=None):
+    # Checkers hold per-file state, so every file gets a fresh set.
+    # Only the selected checkers are built (and only their selected rules compiled)
+    checkers = []
+    for checker_name, checker_class in checker_registry.items():
+        if selection is not None and not selection.checker_enabled(checker_name):
+            continue
+        if getattr(checker_class, "selectable_rules", False):
+            checkers.append(checker_class(selection))
+        else:
+            checkers.append(checker_class())
+    return checkers
+
+class SpillBuffer:
+    """List-like store for one checker's messages.
+
+    Keeps at most max_items messages in memory; older ones are appended to a
+    temporary file as they come in, so memory stays bounded no matter how many
+    errors a file has. Iterating yields all messages in the order they were added."""
+    max_items = 256
+
+    def __init__(self, items=()):
+        self.items = []
+        self.spill_fd = None
+        self.count = 0
+        self.extend(items)
+
+    def append(self, item):
+        self.items.append(item)
+        self.count += 1
+        if len(self.items) >= self.max_items:
+            self.spill()
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def spill(self):
+        if self.spill_fd is None:
+            import tempfile
+            self.spill_fd = tempfile.TemporaryFile("w+")
+        for item in self.items:
+            self.spill_fd.write(json.dumps(encode_item(item)) + "\n")
+        del self.items[:]
+
+    def clear(self):
+        self.close()
+        del self.items[:]
+        self.count = 0
+
+    def close(self):
+        if self.spill_fd is not None:
+            self.spill_fd.close()
+            self.spill_fd = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if self.spill_fd is not None:
+            self.spill_fd.flush()
+            self.spill_fd.seek(0)
+            for spilled_line in self.spill_fd:
+                yield decode_item(json.loads(spilled_line))
+            self.spill_fd.seek(0, os.SEEK_END)
+        for item in self.items:
+            yield item
+
+def new_output(checker_names=None):
+    output = OrderedDict([("NameCommentChecker", SpillBuffer()), 
+                          ("IncludeDirectiveChecker", SpillBuffer()), 
+                          ("NamingChecker", SpillBuffer()), 
+                          ("BlocksChecker", SpillBuffer()), 
+                          ("LineLengthChecker", SpillBuffer(["Ignore if 80+ char error is caused by a necessary function declaration etc.",])), 
+                          ("HorizontalSpaceChecker", SpillBuffer()), 
+                          ("VerticalSpaceChecker", SpillBuffer()), 
+                          ("IndentationChecker", SpillBuffer())])
+    if checker_names is not None:
+        # Only the checkers that run get a section in the report
+        for checker_name in list(output):
+            if checker_name not in checker_names:
+                del output[checker_name]
+        for checker_name in checker_names:
+            if checker_name not in output: # checkers outside the registry, e.g. ProjectChecker
+                output[checker_name] = SpillBuffer()
+    return output
+
+def close_output(output):
+    for value_list in output.values():
+        value_list.close()
+
+def new_error_count(checker_names=None):
+    if checker_names is None:
+        checker_names = checker_registry
+    return OrderedDict((checker_name, []) for checker_name in checker_names)
+
+class IncrementalResult:
+    """Result of check_incremental()/recheck_incremental().
+
+    Besides the findings of every line, it keeps snapshots of the lexer and checker
+    state (checkpoints) taken every checkpoint_interval lines, so that after an edit
+    checking can resume from the nearest checkpoint above it and stop as soon as the
+    state is the same as in the previous run again."""
+    checkpoint_interval = 32
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.line_items = []  # per line: ((checker name, diagnostic), ...) found while checking it
+        self.checkpoints = {} # line index -> (state, error counts) before checking that line
+        self.checkers = make_checkers()
+        self.base_checker = BaseChecker(self.checkers)
+        self.checked_lines = 0
+
+    def save_state(self):
+        state = (self.base_checker.lexer.in_comment, tuple(checker.snapshot() for checker in self.checkers))
+        return state, tuple(checker.error_count for checker in self.checkers)
+
+    def load_state(self, state, counts):
+        self.base_checker.lexer.in_comment = state[0]
+        for checker, checker_state, count in zip(self.checkers, state[1], counts):
+            checker.restore(checker_state)
+            checker.error_count = count
+
+    def run(self, index, previous=None, line_delta=0, edit_end=0):
+        """Checks the lines from index on. With a previous result, stops once the state matches
+        the previous run at the same line after the edit (edit_end) and reuses the rest of it."""
+        # Checkers that look at absolute line numbers (e.g. the first 10 lines) make
+        # states at shifted lines comparable only past their window
+        line_window = max([getattr(checker, "line_window", 0) for checker in self.checkers])
+        line_output = OrderedDict((checker.__class__.__name__, []) for checker in self.checkers)
+
+        while index < len(self.lines):
+            old_index = index - line_delta
+            if previous is not None and index >= edit_end and old_index in previous.checkpoints and \
+               (line_delta == 0 or min(index, old_index) >= line_window):
+                state, counts = self.save_state()
+                old_state, old_counts = previous.checkpoints[old_index]
+                if state == old_state:
+                    self.reuse(previous, old_index, line_delta, counts, old_counts)
+                    return
+                if index % self.checkpoint_interval == 0:
+                    self.checkpoints[index] = (state, counts)
+            elif index % self.checkpoint_interval == 0:
+                self.checkpoints[index] = self.save_state()
+
+            self.base_checker.check_line(self.lines[index], index + 1, line_output)
+            items = ()
+            for checker_name, value_list in line_output.items():
+                if value_list:
+                    items += tuple((checker_name, item) for item in value_list)
+                    del value_list[:]
+            self.line_items.append(items)
+            self.checked_lines += 1
+            index += 1
+        self.checkpoints[index] = self.save_state()
+
+    def reuse(self, previous, old_index, line_delta, counts, old_counts):
+        count_delta = [count - old_count for count, old_count in zip(counts, old_counts)]
+        for items in previous.line_items[old_index:]:
+            if items and line_delta:
+                items = tuple((checker_name, item.moved(line_delta)) for checker_name, item in items)
+            self.line_items.append(items)
+        for checkpoint, (state, checkpoint_counts) in previous.checkpoints.items():
+            if checkpoint >= old_index:
+                self.checkpoints[checkpoint + line_delta] = (state, tuple(count + delta for count, delta in zip(checkpoint_counts, count_delta)))
+        self.load_state(*self.checkpoints[len(self.lines)])
+
+    def report(self):
+        """Returns (output, error_count) ordered dictionaries, as filled in by a full run."""
+        output = new_output()
+        error_count = new_error_count()
+        for items in self.line_items:
+            for checker_name, item in items:
+                output[checker_name].append(item)
+        # finalize() changes the checkers, so run it on a copy of the end state
+        state, counts = self.save_state()
+        for checker in self.checkers:
+            checker.finalize(min(len(self.lines), getattr(checker, "line_window", len(self.lines))), output)
+        for checker in self.checkers:
+            checker.count_errors(error_count)
+        self.load_state(state, counts)
+        return output, error_count
+
+def split_lines(text):
+    """Splits text into lines the way SourceReader.lines() does: only \n, \r\n and a lone
+    \r end a line (str.splitlines() also splits on form feeds and other separators),
+    and all three come out as \n."""
+    return list(io.StringIO(text, newline=None))
+
+def check_incremental(lines):
+    """Checks all lines (with line endings) and returns an IncrementalResult that can
+    be re-checked cheaply after edits with recheck_incremental()."""
+    result = IncrementalResult(list(lines))
+    result.run(0)
+    return result
+
+def recheck_incremental(previous, start, end, new_text):
+    """Re-checks a file after the edit that replaced lines start to end - 1 (0-based,
+    end exclusive) of the previous result with new_text. Only the lines from the
+    checkpoint before the edit up to the point where the checker state matches the
+    previous run again are checked; the findings for the rest are reused."""
+    new_lines = split_lines(new_text)
+    result = IncrementalResult(previous.lines[:start] + new_lines + previous.lines[end:])
+    resume = max([checkpoint for checkpoint in previous.checkpoints if checkpoint <= start])
+    result.line_items = previous.line_items[:resume]
+    result.checkpoints = dict((checkpoint, value) for checkpoint, value in previous.checkpoints.items() if checkpoint <= resume)
+    result.load_state(*previous.checkpoints[resume])
+    result.run(resume, previous, len(new_lines) - (end - start), start + len(new_lines))
+    return result
+
+def write_report(out_file_name, file_name, output, error_count):
+    with open(out_file_name, "w") as out_fd:
+        for key, value_list in error_count.items():
+            for item in value_list:
+                out_fd.write(item + "\n")
         
-        checkers = [name_comment_checker, include_directive_checker, naming_checker, blocks_checker, line_length_checker, horizontal_space_checker, vertical_space_checker, indentation_checker]
+        out_fd.write("\nErrors found:\n")
+        for key, value_list in output.items():
+            out_fd.write(key + ": \n")
+            if not value_list:
+                out_fd.write("No errors found\n\n");
+                continue
+            for item in value_list:
+                out_fd.write(str(item) + "\n\n")
 
-        with open(file_name, "r") as user_fd:
-            base_checker = BaseChecker(checkers)
-            base_checker.check_styles(user_fd, output, error_count)
+def write_jsonl_report(out_file_name, file_name, output, error_count):
+    # One record per diagnostic (template and arguments, the message text is never built),
+    # then one summary record per checker
+    with open(out_file_name, "w") as out_fd:
+        for key, value_list in output.items():
+            for item in value_list:
+                if isinstance(item, Diagnostic):
+                    record = OrderedDict([("file", file_name)])
+                    record.update(item.to_dict())
+                    out_fd.write(json.dumps(record) + "\n")
+        for key, value_list in error_count.items():
+            out_fd.write(json.dumps(OrderedDict([("file", file_name), ("checker", key), ("summary", value_list)])) + "\n")
 
-            for key, value_list in error_count.items():
-                for item in value_list:
-                    out_fd.write(item + "\n")
-            
-            out_fd.write("\nErrors found:\n")
-            for key, value_list in output.items():
-                out_fd.write(key + ": \n")
-                if not value_list:
-                    out_fd.write("No errors found\n\n");
+def write_sarif_report(out_file_name, file_name, output, error_count):
+    # Results are written one by one as they are read back from the output buffers;
+    # the rule list is only known at the end, so the tool object comes last
+    rule_index = OrderedDict()
+    with open(out_file_name, "w") as out_fd:
+        out_fd.write('{"$schema": "https://json.schemastore.org/sarif-2.1.0.json", "version": "2.1.0", "runs": [{"results": [')
+        separator = "\n"
+        for key, value_list in output.items():
+            for item in value_list:
+                if not isinstance(item, Diagnostic):
                     continue
-                for item in value_list:
-                    out_fd.write(item + "\n\n")
-                    
-        print("Check complete! See the errors in ./" + out_file_name)
+                rule_id = item.checker + "." + item.rule
+                if rule_id not in rule_index:
+                    rule_index[rule_id] = len(rule_index)
+                physical_location = {"artifactLocation": {"uri": file_name.replace(os.sep, "/")}}
+                if item.line is not None:
+                    physical_location["region"] = {"startLine": item.line}
+                    if item.column is not None:
+                        physical_location["region"]["startColumn"] = item.column
+                result = OrderedDict([("ruleId", rule_id), ("ruleIndex", rule_index[rule_id]), ("level", item.severity),
+                                      ("message", {"text": item.message()}), ("locations", [{"physicalLocation": physical_location}])])
+                out_fd.write(separator + json.dumps(result))
+                separator = ",\n"
+        tool = {"driver": {"name": "c-style-checker", "informationUri": "https://github.com/ljohr/c-style-checker",
+                           "rules": [{"id": rule_id} for rule_id in rule_index]}}
+        out_fd.write('\n], "tool": ' + json.dumps(tool) + '}]}\n')
 
+# Report format name -> (suffix of the report file, writer)
+report_formats = OrderedDict([("text", ("_style_info.txt", write_report)),
+                              ("jsonl", ("_style_info.jsonl", write_jsonl_report)),
+                              ("sarif", ("_style_info.sarif", write_sarif_report))])
+
+def check_file(file_name, cache=None, report_format="text", checkers=None, profiler=None, changed_lines=None,
+               selection=None, project_index=None):
+    """Checks one .c file, writes its report (_style_info.txt for the text format) and returns
+    (out_file_name, error totals per checker, whether the result came from the cache).
+    With changed_lines (a set of line numbers), only findings on those lines are reported.
+    With a RuleSelection, only the selected checkers and rules run. With a ProjectIndex,
+    the file is also checked against the rest of the project (ProjectChecker)."""
+    file_checker(file_name)
+    report_suffix, report_writer = report_formats[report_format]
+    out_file_name = file_name[:-2] + report_suffix
+    checker_names = None
+    if checkers is not None:
+        checker_names = [checker.__class__.__name__ for checker in checkers]
+    elif selection is not None:
+        checker_names = selection.checker_names()
+    if project_index is not None:
+        checker_names = list(checker_names or checker_registry) + ["ProjectChecker"]
+    output = new_output(checker_names)
+    error_count = new_error_count(checker_names)
+
+    source = SourceReader(file_name)
+    try:
+        if cache is not None:
+            key = cache.key(source.data, changed_lines, selection, project_index)
+            totals = cache.load(key, output, error_count)
+            if totals is not None:
+                report_writer(out_file_name, file_name, output, error_count)
+                return out_file_name, totals, True
+
+        if checkers is None:
+            checkers = make_checkers(selection)
+        if project_index is not None:
+            checkers = checkers + [ProjectChecker(project_index, file_name)]
+        if profiler is not None:
+            profiler.file_name = file_name
+        base_checker = BaseChecker(checkers, profiler)
+        base_checker.check_styles(source.lines(), output, error_count, changed_lines)
+
+        report_writer(out_file_name, file_name, output, error_count)
+        totals = OrderedDict((checker.__class__.__name__, checker.error_count) for checker in checkers)
+        if cache is not None:
+            cache.store(key, output, error_count, totals)
+        return out_file_name, totals, False
+    finally:
+        # Remove the spill files
+        close_output(output)
+        source.close()
+
+# The ProjectIndex of a --project run, set once per worker process instead of being sent with every file
+_project_index = None
+
+def set_project_index(project_index):
+    global _project_index
+    _project_index = project_index
+
+def check_file_job(file_name, cache=None, report_format="text", changed_lines=None, selection=None):
+    # Runs in a worker process: report problems instead of raising so one bad file
+    # does not abort the whole batch
+    try:
+        out_file_name, totals, cached = check_file(file_name, cache, report_format, changed_lines=changed_lines,
+                                                   selection=selection, project_index=_project_index)
+        return file_name, out_file_name, totals, cached, None
     except ValueError as e:
-        print(e)
+        return file_name, None, None, False, str(e)
+
+def profile_file_job(file_name, report_format, profiler, changed_lines=None, selection=None):
+    # Profiling needs all timings in this process, so no pool and no cache
+    try:
+        out_file_name, totals, cached = check_file(file_name, None, report_format, profiler=profiler, changed_lines=changed_lines,
+                                                   selection=selection, project_index=_project_index)
+        return file_name, out_file_name, totals, cached, None
+    except ValueError as e:
+        return file_name, None, None, False, str(e)
+
+def parse_unified_diff(diff_text, root="."):
+    """Returns the lines added or changed by a unified diff: an OrderedDict of file name
+    (joined to root) -> set of line numbers in the new version of the file. Deleted files
+    are left out."""
+    changed_lines = OrderedDict()
+    lines = None
+    new_line = 0
+    old_left = new_left = 0 # lines of the current hunk still to come
+    for diff_line in diff_text.splitlines():
+        if old_left > 0 or new_left > 0:
+            if diff_line.startswith("+"):
+                if lines is not None:
+                    lines.add(new_line)
+                new_line += 1
+                new_left -= 1
+            elif diff_line.startswith("-"):
+                old_left -= 1
+            elif not diff_line.startswith("\\"): # "\ No newline at end of file"
+                new_line += 1
+                old_left -= 1
+                new_left -= 1
+        elif diff_line.startswith("+++ "):
+            path = diff_line[4:].split("\t")[0].strip()
+            if path == "/dev/null":
+                lines = None
+                continue
+            if path.startswith("b/"):
+                path = path[2:]
+            lines = changed_lines.setdefault(os.path.normpath(os.path.join(root, path)), set())
+        elif diff_line.startswith("@@"):
+            match = re.match(r'@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@', diff_line)
+            if match:
+                old_left = int(match.group(1) or 1)
+                new_line = int(match.group(2))
+                new_left = int(match.group(3) or 1)
+    return changed_lines
+
+def git_changed_lines(revision="HEAD", repository="."):
+    """Runs git diff against revision in the repository and returns parse_unified_diff's result."""
+    import subprocess
+    try:
+        root = subprocess.check_output(["git", "rev-parse", "--show-toplevel"], cwd=repository,
+                                       universal_newlines=True).strip()
+        diff_text = subprocess.check_output(["git", "diff", "--no-color", "--no-ext-diff", "-U0", revision, "--", "*.c"],
+                                            cwd=root, universal_newlines=True)
+    except (OSError, subprocess.CalledProcessError):
+        raise ValueError("Could not run git diff " + revision + " in " + repository)
+    return parse_unified_diff(diff_text, os.path.relpath(root))
+
+def check_files(file_names, jobs, cache=None, report_format="text", changed_lines=None, selection=None, project_index=None):
+    """Checks many files, spreading them across a process pool when jobs > 1.
+    changed_lines optionally maps file names to the line numbers to report on.
+    Yields check_file_job results in input order."""
+    set_project_index(project_index)
+    file_changed_lines = [changed_lines.get(file_name) if changed_lines is not None else None for file_name in file_names]
+    if jobs <= 1 or len(file_names) <= 1:
+        for file_name, lines in zip(file_names, file_changed_lines):
+            yield check_file_job(file_name, cache, report_format, lines, selection)
+        return
+    chunk_size = max(1, len(file_names) // (jobs * 4))
+    # Imported here so that single-file runs do not pay for concurrent.futures
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs, initializer=set_project_index, initargs=(project_index,)) as executor:
+        for result in executor.map(check_file_job, file_names, [cache] * len(file_names), [report_format] * len(file_names),
+                                   file_changed_lines, [selection] * len(file_names), chunksize=chunk_size):
+            yield result
+
+class CheckResult:
+    """Findings for one in-memory source checked by check_source().
+
+    diagnostics are the Diagnostic records in report order, error_count the per-checker
+    summary lines of the text report and totals the number of errors per checker."""
+    def __init__(self, name, diagnostics, error_count, totals):
+        self.name = name
+        self.diagnostics = diagnostics
+        self.error_count = error_count
+        self.totals = totals
+
+    def total_errors(self):
+        return sum(self.totals.values())
+
+    def to_dict(self):
+        diagnostics = []
+        for diagnostic in self.diagnostics:
+            record = diagnostic.to_dict()
+            record["message"] = diagnostic.message()
+            diagnostics.append(record)
+        return {"name": self.name, "diagnostics": diagnostics, "error_count": list(self.error_count.items()),
+                "totals": list(self.totals.items())}
+
+def check_source(source, name="<buffer>", checkers=None, selection=None):
+    """Checks C source held in a string and returns a CheckResult; nothing is written to disk
+    (apart from spill files for very long reports, removed before returning)."""
+    if checkers is None:
+        checkers = make_checkers(selection)
+    checker_names = [checker.__class__.__name__ for checker in checkers]
+    output = new_output(checker_names)
+    error_count = new_error_count(checker_names)
+    if source.startswith("\ufeff"):
+        source = source[1:] # byte order mark, skipped for files too
+    try:
+        BaseChecker(checkers).check_styles(split_lines(source), output, error_count)
+        diagnostics = [item for value_list in output.values() for item in value_list if isinstance(item, Diagnostic)]
+    finally:
+        close_output(output)
+    totals = OrderedDict((checker.__class__.__name__, checker.error_count) for checker in checkers)
+    return CheckResult(name, diagnostics, error_count, totals)
+
+class AsyncChecker:
+    """check_source() for asyncio code, e.g. a web service checking submissions.
+
+    Checking is CPU-bound, so it runs in an executor (by default a process pool of
+    max_workers processes) and never blocks the event loop. At most max_pending checks
+    are queued or running; further check() calls wait for a free slot, so a burst of
+    requests cannot pile up unbounded work. The timeout covers the whole call: waiting
+    for a slot, waiting in the executor's queue and checking. A check that runs out of
+    time raises asyncio.TimeoutError; if it has not started yet it is dropped, otherwise
+    its slot is only freed once the worker is done with it.
+
+        async with AsyncChecker(max_workers=4, timeout=10) as checker:
+            result = await checker.check(source, "submission.c")
+    """
+    def __init__(self, max_workers=None, max_pending=None, timeout=None, selection=None, executor=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self.timeout = timeout
+        self.selection = selection
+        self.own_executor = executor is None
+        if executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self.executor = executor
+        self.slots = None # asyncio.Semaphore, created on first use inside the event loop
+
+    async def check(self, source, name="<buffer>", timeout=None):
+        # Imported here so that the command line does not pay for asyncio
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else loop.time() + timeout
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_pending)
+        await asyncio.wait_for(self.slots.acquire(), timeout)
+        try:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            future = self.executor.submit(check_source, source, name, None, self.selection)
+        except BaseException:
+            self.slots.release()
+            raise
+        # Free the slot when the work is really over, not when the caller stops waiting
+        future.add_done_callback(lambda done: self.release_slot(loop))
+        return await asyncio.wait_for(asyncio.wrap_future(future), remaining)
+
+    def release_slot(self, loop):
+        # Called from the executor's thread
+        try:
+            loop.call_soon_threadsafe(self.slots.release)
+        except RuntimeError:
+            pass # the event loop is already closed, nobody is waiting for the slot
+
+    async def check_many(self, sources, timeout=None):
+        """Checks (name, source) pairs concurrently; returns CheckResults, or the exception
+        raised for a source, in input order."""
+        import asyncio
+        return await asyncio.gather(*[self.check(source, name, timeout) for name, source in sources],
+                                    return_exceptions=True)
+
+    def close(self):
+        if self.own_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+class CheckServer:
+    """Long-running checker that answers check requests, one JSON object per line.
+
+    Requests are {"path": "file.c", "format": "text"}, which writes the report like the
+    command line does, or {"source": "...", "name": "buffer.c"}, which returns the
+    findings as records. {"command": "ping"} and {"command": "shutdown"} are also
+    understood. An "id" in the request is copied into the response.
+
+    The checkers and their compiled rules are built once as a template; every request
+    gets shallow copies of them with the per-file state reset from the template's
+    initial snapshot, so requests can run concurrently.
+
+    With a cache, the server evicts old entries every evict_every new entries and when
+    it stops, since the command line's evict() at the end of a run never comes."""
+    evict_every = 50
+
+    def __init__(self, cache=None):
+        import threading
+        self.cache = cache
+        self.stores = 0
+        self.evict_lock = threading.Lock()
+        self.template = make_checkers()
+        self.initial_states = [checker.snapshot() for checker in self.template]
+        self.shutdown_callback = None
+        rules_fingerprint()
+
+    def fresh_checkers(self):
+        import copy
+        checkers = []
+        for template_checker, state in zip(self.template, self.initial_states):
+            checker = copy.copy(template_checker)
+            checker.restore(state)
+            checker.error_count = 0
+            checkers.append(checker)
+        return checkers
+
+    def respond(self, request_line):
+        """Answers one request line (str or UTF-8 bytes). Always returns a response, so a
+        client waiting for an "id" gets one even when the request breaks the check."""
+        try:
+            if isinstance(request_line, bytes):
+                request_line = request_line.decode("utf-8")
+        except UnicodeDecodeError:
+            return {"ok": False, "error": "Request is not valid UTF-8"}
+        try:
+            request = json.loads(request_line)
+        except ValueError:
+            return {"ok": False, "error": "Request is not valid JSON"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "Request must be a JSON object"}
+        try:
+            response = self.handle(request)
+        except Exception as e:
+            # Not a mistake in the request: keep serving, but say what broke
+            response = {"ok": False, "error": "Internal error: " + e.__class__.__name__ + ": " + str(e)}
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    def handle(self, request):
+        command = request.get("command", "check")
+        if command == "ping":
+            return {"ok": True}
+        if command == "shutdown":
+            if self.shutdown_callback is not None:
+                # Must not block the handler thread that is answering this request
+                import threading
+                threading.Thread(target=self.shutdown_callback).start()
+            return {"ok": True}
+        try:
+            for field in ("source", "path", "name", "format"):
+                if field in request and not isinstance(request[field], str):
+                    raise ValueError("\"" + field + "\" must be a string")
+            if "source" in request:
+                return self.check_source(request["source"], request.get("name", "<buffer>"))
+            if "path" in request:
+                report_format = request.get("format", "text")
+                if report_format not in report_formats:
+                    raise ValueError("Unknown report format: " + str(report_format) +
+                                     " (expected one of: " + ", ".join(report_formats) + ")")
+                out_file_name, totals, cached = check_file(request["path"], self.cache, report_format,
+                                                           self.fresh_checkers())
+                if self.cache is not None and not cached:
+                    self.stored()
+                return {"ok": True, "report": out_file_name, "totals": list(totals.items()), "cached": cached}
+            raise ValueError("Request needs a path or a source")
+        except (ValueError, KeyError) as e:
+            return {"ok": False, "error": str(e)}
+
+    def check_source(self, source, name):
+        response = {"ok": True}
+        response.update(check_source(source, name, self.fresh_checkers()).to_dict())
+        return response
+
+    def stored(self):
+        with self.evict_lock:
+            self.stores += 1
+            if self.stores % self.evict_every == 0:
+                self.cache.evict()
+
+    def evict(self):
+        if self.cache is not None:
+            with self.evict_lock:
+                self.cache.evict()
+
+    def serve_socket(self, socket_path):
+        import socketserver
+        import stat
+
+        class CheckRequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for request_line in self.rfile:
+                    response = self.server.check_server.respond(request_line)
+                    self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+        try:
+            mode = os.lstat(socket_path).st_mode
+        except OSError:
+            mode = None
+        if mode is not None:
+            if not stat.S_ISSOCK(mode):
+                raise ValueError("Not a socket, refusing to replace it: " + socket_path)
+            os.remove(socket_path) # left over from a server that did not shut down cleanly
+        server = socketserver.ThreadingUnixStreamServer(socket_path, CheckRequestHandler)
+        server.daemon_threads = True
+        server.check_server = self
+        self.shutdown_callback = server.shutdown
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.remove(socket_path)
+            self.evict()
+
+    def serve_stdio(self, in_fd, out_fd, workers=4):
+        # Requests are answered as they finish, so responses can come out of order; use "id"
+        import threading
+        write_lock = threading.Lock()
+        self.shutdown_callback = None
+
+        def answer(request_line):
+            response = json.dumps(self.respond(request_line))
+            with write_lock:
+                out_fd.write(response + "\n")
+                out_fd.flush()
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for request_line in in_fd:
+                if not request_line.strip():
+                    continue
+                try:
+                    request = json.loads(request_line)
+                except ValueError:
+                    request = None
+                if isinstance(request, dict) and request.get("command") == "shutdown":
+                    # Answered here so that no request after it is read; the pool still
+                    # finishes the checks already submitted before the server returns
+                    answer(request_line)
+                    break
+                executor.submit(answer, request_line)
+        self.evict()
+
+def main():
+    parser = argparse.ArgumentParser(usage="python style_checker.py [-j JOBS] <file_name.c | directory | glob> ...")
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes used when checking several files (default: all cores)")
+    parser.add_argument("--format", choices=list(report_formats), default="text",
+                        help="report format: text (default), jsonl (JSON Lines) or sarif")
+    parser.add_argument("--cache-dir",
+                        help="directory of a persistent result cache; unchanged files are not checked again")
+    parser.add_argument("--cache-size", type=int, default=100,
+                        help="maximum size of the result cache in MB (default: 100)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every checker and rule and print a table of the results (checks files one by one)")
+    parser.add_argument("--profile-trace", metavar="FILE",
+                        help="with --profile, also write the timings as a Chrome trace (JSON) to FILE")
+    parser.add_argument("--select", metavar="RULES",
+                        help="comma separated checkers or rules to run, e.g. LineLengthChecker,HorizontalSpaceChecker.lr_spacing (default: all)")
+    parser.add_argument("--ignore", metavar="RULES",
+                        help="comma separated checkers or rules not to run")
+    parser.add_argument("--config", metavar="FILE",
+                        help="read select/ignore from the [style_checker] section of FILE (default: .style_checker.cfg if present)")
+    parser.add_argument("--project", metavar="ROOT",
+                        help="index the .c/.h files under ROOT and also check files against the whole project (default files: all .c files under ROOT)")
+    parser.add_argument("--index", metavar="FILE",
+                        help="where --project keeps its index between runs (default: ROOT/.style_checker_index.json)")
+    parser.add_argument("--diff", metavar="FILE",
+                        help="only report findings on the lines added or changed by this unified diff (\"-\" for stdin)")
+    parser.add_argument("--git-diff", metavar="REV", nargs="?", const="HEAD",
+                        help="only report findings on the lines changed since REV (default: HEAD) in the current git repository")
+    parser.add_argument("--serve", metavar="SOCKET",
+                        help="run as a check server on this Unix socket (\"-\" for stdin/stdout)")
+    parser.add_argument("--server", metavar="SOCKET",
+                        help="send the files to the check server on this Unix socket instead of checking them here")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    if args.serve:
+        check_server = CheckServer(cache)
+        if args.serve == "-":
+            check_server.serve_stdio(sys.stdin, sys.stdout)
+        else:
+            try:
+                check_server.serve_socket(args.serve)
+            except ValueError as e:
+                print(str(e))
+                sys.exit(1)
+        return
+
+    changed_lines = None
+    try:
+        config_file = args.config
+        if config_file is None and os.path.isfile(".style_checker.cfg"):
+            config_file = ".style_checker.cfg"
+        selection = None
+        if config_file is not None or args.select is not None or args.ignore is not None:
+            selection = load_selection(config_file, args.select, args.ignore)
+        if selection is None or (not selection.select and not selection.ignore):
+            selection = None # everything runs
+        elif not selection.checker_names():
+            raise ValueError("No checkers selected")
+        if args.diff == "-":
+            changed_lines = parse_unified_diff(sys.stdin.read())
+        elif args.diff:
+            with open(args.diff, "r") as diff_fd:
+                changed_lines = parse_unified_diff(diff_fd.read())
+        elif args.git_diff:
+            changed_lines = git_changed_lines(args.git_diff)
+    except (IOError, OSError, ValueError) as e:
+        print(str(e))
+        return
+
+    if not args.paths and changed_lines is None and not args.project:
+        print("Usage: python style_checker.py <file_name.c> [<file_name.c | directory | glob> ...]")
+        return
+
+    client = None
+    if args.server and changed_lines is None and selection is None and not args.project:
+        # the server checks whole files with all rules and no project index
+        try:
+            client = CheckClient(args.server)
+        except (IOError, OSError):
+            client = None # no server running, check the files here
+
+    project_index = None
+    if args.project:
+        if not os.path.isdir(args.project):
+            print("Project directory not found: " + args.project)
+            return
+        project_index = ProjectIndex(args.project, args.index)
+        project_index.update(args.jobs)
+        print("Project index: " + str(len(project_index.files)) + " files, " + str(project_index.read_files) + " read, " +
+              str(project_index.parsed_files) + " parsed")
+
+    if changed_lines is None and not args.paths and project_index is not None:
+        file_names = [os.path.normpath(os.path.join(args.project, path)) for path in sorted(project_index.files) if path.endswith(".c")]
+    elif changed_lines is None:
+        file_names = collect_files(args.paths)
+    else:
+        # Only the changed .c files, and of those only the ones asked for if paths are given
+        file_names = [file_name for file_name, lines in changed_lines.items()
+                      if lines and file_name.endswith(".c") and os.path.isfile(file_name)]
+        if args.paths:
+            wanted = set(os.path.normpath(file_name) for file_name in collect_files(args.paths))
+            file_names = [file_name for file_name in file_names if file_name in wanted]
+        if not file_names:
+            print("No changed .c files to check")
+            return
+    profiler = None
+    if args.profile or args.profile_trace:
+        profiler = Profiler()
+        client = None
+        set_project_index(project_index)
+        file_results = (profile_file_job(file_name, args.format, profiler, changed_lines and changed_lines[file_name], selection)
+                        for file_name in file_names)
+    elif client is not None:
+        file_results = (client.check_file_job(file_name, args.format) for file_name in file_names)
+    else:
+        file_results = check_files(file_names, args.jobs, cache, args.format, changed_lines, selection, project_index)
+
+    results = print_results(file_names, file_results)
+
+    if client is not None:
+        client.close()
+    if len(file_names) > 1:
+        print_summary(results)
+    if profiler is not None:
+        print("\n" + profiler.table())
+        if args.profile_trace:
+            profiler.write_trace(args.profile_trace)
+            print("Trace written to " + args.profile_trace)
+    if cache is not None and client is None:
+        # Worker processes have their own cache objects, so count from the results
+        hits = len([result for result in results if result[3]])
+        misses = len([result for result in results if not result[3] and not result[4]])
+        print("Cache: " + str(hits) + " hits, " + str(misses) + " misses")
+        cache.evict()
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,162 @@
+"""Thin command line client for a style_checker.py check server.
+
+    python style_client.py --server /tmp/style_checker.sock file_name.c
+
+Takes the same arguments as style_checker.py. Runs the server can answer only pay
+for starting the interpreter, the few standard modules below and socket; style_checker.py
+is a large script that Python compiles again on every run, so use this file as the
+command in hooks. Anything else (no server listening, options the server does not
+support) is passed on to style_checker.main(), which then uses its cached bytecode.
+style_checker.py itself also hands --server runs to main() here before its imports.
+"""
+from collections import OrderedDict
+import json
+import os
+
+def file_checker(file_name):
+    # A directory or glob pattern is only left in the list when it matched no files
+    if os.path.isdir(file_name):
+        raise ValueError("No .c files found")
+    if is_pattern(file_name) and not os.path.exists(file_name):
+        raise ValueError("No files match")
+
+    # Check file type
+    if file_name[-2:] != ".c":
+        raise ValueError("Please enter a .c file!")
+
+    # Check if file exists
+    if not os.path.isfile(file_name):
+        raise ValueError("File not found")
+
+def is_pattern(path):
+    return "*" in path or "?" in path or "[" in path
+
+def collect_files(paths):
+    """Expands directories (recursively) and glob patterns into a list of files. A
+    directory or pattern that matches nothing is kept as it is, so that checking it
+    reports the error (see file_checker()) instead of it being dropped silently."""
+    file_names = []
+    for path in paths:
+        path = path.strip()
+        matches = []
+        if os.path.isdir(path):
+            for dir_path, dir_names, dir_files in os.walk(path):
+                dir_names.sort()
+                for name in sorted(dir_files):
+                    if name.endswith(".c"):
+                        matches.append(os.path.join(dir_path, name))
+        elif is_pattern(path) and not os.path.exists(path):
+            import glob # pulls in re and fnmatch, so only for patterns
+            matches = sorted(glob.glob(path, recursive=True))
+        file_names.extend(matches or [path])
+    return file_names
+
+class CheckClient:
+    """Thin client for a CheckServer listening on a Unix socket."""
+    def __init__(self, socket_path):
+        import socket # local checks never connect, so they do not pay for it
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(socket_path)
+        except (IOError, OSError):
+            self.sock.close()
+            raise
+        self.server_fd = self.sock.makefile("rwb")
+
+    def request(self, request):
+        self.server_fd.write((json.dumps(request) + "\n").encode("utf-8"))
+        self.server_fd.flush()
+        response_line = self.server_fd.readline()
+        if not response_line:
+            raise IOError("Check server closed the connection")
+        return json.loads(response_line.decode("utf-8"))
+
+    def check_file_job(self, file_name, report_format="text"):
+        # Same result tuple as check_file_job(), with the work done by the server
+        try:
+            file_checker(file_name)
+        except ValueError as e:
+            return file_name, None, None, False, str(e)
+        path = os.path.abspath(file_name)
+        response = self.request({"path": path, "format": report_format})
+        if not response["ok"]:
+            return file_name, None, None, False, response["error"]
+        # The server names the report after the absolute path; keep the name as given
+        out_file_name = file_name[:-2] + response["report"][len(path) - 2:]
+        return file_name, out_file_name, OrderedDict(response["totals"]), response["cached"], None
+
+    def close(self):
+        self.server_fd.close()
+        self.sock.close()
+
+def print_results(file_names, file_results):
+    """Prints one line per checked file and returns the results as a list."""
+    results = []
+    for result in file_results:
+        file_name, out_file_name, totals, cached, error = result
+        if error:
+            print(error if len(file_names) == 1 else file_name + ": " + error)
+        else:
+            print("Check complete! See the errors in ./" + out_file_name)
+        results.append(result)
+    return results
+
+def print_summary(results):
+    checked = 0
+    failed = 0
+    totals = OrderedDict()
+    for file_name, out_file_name, file_totals, cached, error in results:
+        if error:
+            failed += 1
+            continue
+        checked += 1
+        for key, value in file_totals.items():
+            totals[key] = totals.get(key, 0) + value
+
+    print("\nSummary: " + str(checked) + " files checked, " + str(failed) + " failed")
+    for key, value in totals.items():
+        print(key + ": " + str(value) + " errors")
+    print("Total errors: " + str(sum(totals.values())))
+
+def main(argv):
+    """Checks the files of a command line on the check server. Only plain runs (paths,
+    --server, --format, -j) are handled; returns False without doing anything when the
+    command line asks for more, a config file may narrow the rules, or no server is
+    listening, so that style_checker.py runs it itself."""
+    paths = []
+    options = {"--server": None, "--format": "text", "-j": None, "--jobs": None}
+    args = iter(argv)
+    for arg in args:
+        name, equals, value = arg.partition("=")
+        if name in options:
+            if not equals:
+                value = next(args, None)
+                if value is None:
+                    return False
+            options[name] = value
+        elif arg.startswith("-"):
+            return False
+        else:
+            paths.append(arg)
+    if not options["--server"] or not paths or os.path.isfile(".style_checker.cfg"):
+        return False
+
+    try:
+        client = CheckClient(options["--server"])
+    except (IOError, OSError):
+        return False
+    try:
+        file_names = collect_files(paths)
+        results = print_results(file_names, (client.check_file_job(file_name, options["--format"])
+                                             for file_name in file_names))
+    finally:
+        client.close()
+    if len(file_names) > 1:
+        print_summary(results)
+    return True
+
+if __name__ == "__main__":
+    import sys
+    if not main(sys.argv[1:]):
+        import style_checker
+        style_checker.main()
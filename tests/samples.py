@@ -0,0 +1,61 @@
+"""C sources shared by the tests."""
+
+# Touches every checker: name comment, includes out of order, naming, blocks and
+# typedefs, long lines, spacing, vertical space, indentation, comments spanning
+# lines, and braces, quotes and operators inside strings and comments
+SAMPLE_SOURCE = """\
+/* Name: Test Student
+ * Purpose: exercise the checkers
+ */
+#include <string.h>
+#include <stdio.h>
+#include "zeta.h"
+
+#include "alpha.h"
+#define MAX(a, b) ((a) > (b) ? (a) : (b))
+
+typedef int Count;
+struct point_t {
+    int x;
+    int y;
+};
+
+Count countItems(int *items, int n) {
+    int i;
+    Count total=0;
+    for(i = 0; i < n; i++)
+    {
+        total += items[i];
+    }
+    return total;
+}
+
+static char *message = "not { a block } /* or a comment */";
+char quote = '"';
+
+int x(void) {
+  int  value = 1;   /* two spaces */
+    if (value == 1) {
+        printf("%d {\\n", value);
+    }
+    /* a comment
+       spanning { lines
+    */
+    switch (value) {
+        case 1:
+            value = ~ value;
+            break;
+        default:
+            break;
+    }
+    return value+1 ;
+}
+
+int long_function_name_that_goes_on_and_on(int first_argument, int second_argument, int third_argument) {
+\treturn first_argument * second_argument;
+}
+int AnotherFunction(void)
+{
+    return ( 0 );
+}
+"""
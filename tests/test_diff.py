@@ -0,0 +1,114 @@
+import os
+import unittest
+
+import style_checker
+
+from tests.samples import SAMPLE_SOURCE
+
+
+class ParseUnifiedDiffTest(unittest.TestCase):
+    def test_context_hunks(self):
+        diff_text = (
+            "diff --git a/src/main.c b/src/main.c\n"
+            "--- a/src/main.c\n"
+            "+++ b/src/main.c\n"
+            "@@ -1,4 +1,5 @@\n"
+            " #include <stdio.h>\n"
+            "-int old;\n"
+            "+int new;\n"
+            "+int added;\n"
+            " \n"
+            " int main(void) {\n"
+            "@@ -10,3 +11,3 @@ int main(void) {\n"
+            "     a = 1;\n"
+            "-    b = 2;\n"
+            "+    b = 3;\n"
+            "     c = 4;\n")
+        self.assertEqual(style_checker.parse_unified_diff(diff_text),
+                         {os.path.normpath("src/main.c"): set([2, 3, 12])})
+
+    def test_zero_context_hunks(self):
+        # git diff -U0: hunks without context lines, pure insertions and pure deletions
+        diff_text = (
+            "--- a/a.c\n"
+            "+++ b/a.c\n"
+            "@@ -3 +3 @@\n"
+            "-int x;\n"
+            "+int y;\n"
+            "@@ -7,0 +8,2 @@\n"
+            "+int z;\n"
+            "+int w;\n"
+            "@@ -20,2 +21,0 @@\n"
+            "-int gone;\n"
+            "-int also_gone;\n"
+            "@@ -30 +29 @@\n"
+            "-}\n"
+            "+ }\n")
+        self.assertEqual(style_checker.parse_unified_diff(diff_text), {"a.c": set([3, 8, 9, 29])})
+
+    def test_new_and_deleted_files(self):
+        diff_text = (
+            "--- /dev/null\n"
+            "+++ b/new.c\n"
+            "@@ -0,0 +1,2 @@\n"
+            "+int a;\n"
+            "+int b;\n"
+            "--- a/old.c\n"
+            "+++ /dev/null\n"
+            "@@ -1,2 +0,0 @@\n"
+            "-int a;\n"
+            "-int b;\n")
+        self.assertEqual(style_checker.parse_unified_diff(diff_text), {"new.c": set([1, 2])})
+
+    def test_prefixes_and_root(self):
+        # Plain diff -u output has no b/ prefix, and may carry a timestamp after a tab
+        diff_text = (
+            "--- lib/util.c\t2024-01-01 10:00:00\n"
+            "+++ lib/util.c\t2024-01-02 10:00:00\n"
+            "@@ -1 +1 @@\n"
+            "-int a;\n"
+            "+int b;\n"
+            "--- a/b/inner.c\n"
+            "+++ b/b/inner.c\n"
+            "@@ -1 +1 @@\n"
+            "-int a;\n"
+            "+int b;\n")
+        self.assertEqual(style_checker.parse_unified_diff(diff_text, "repo"),
+                         {os.path.join("repo", "lib", "util.c"): set([1]),
+                          os.path.join("repo", "b", "inner.c"): set([1])})
+
+    def test_no_newline_marker_and_diff_lines_in_content(self):
+        # Removed or added lines that look like headers must not be taken for them
+        diff_text = (
+            "--- a/a.c\n"
+            "+++ b/a.c\n"
+            "@@ -1,2 +1,2 @@\n"
+            "--- int decrement;\n"
+            "+++ int increment;\n"
+            " int last;\n"
+            "\\ No newline at end of file\n")
+        self.assertEqual(style_checker.parse_unified_diff(diff_text), {"a.c": set([1])})
+
+
+class ChangedLinesTest(unittest.TestCase):
+    def check(self, lines, changed_lines=None):
+        checker_names = list(style_checker.checker_registry)
+        output = style_checker.new_output(checker_names)
+        error_count = style_checker.new_error_count(checker_names)
+        style_checker.BaseChecker(style_checker.make_checkers()).check_styles(lines, output, error_count, changed_lines)
+        return [(item.checker, item.rule, item.line, item.column, item.message())
+                for value_list in output.values() for item in value_list
+                if isinstance(item, style_checker.Diagnostic) and item.line is not None]
+
+    def test_findings_are_the_full_findings_on_changed_lines(self):
+        lines = style_checker.split_lines(SAMPLE_SOURCE)
+        full = self.check(lines)
+        for changed_lines in [set([1]), set([5, 6, 7]), set(range(17, 27)), set([33, 34, 40, 45]),
+                              set(range(1, len(lines) + 1, 3)), set(range(1, len(lines) + 1))]:
+            self.assertEqual(self.check(lines, changed_lines),
+                             [finding for finding in full if finding[2] in changed_lines],
+                             "changed lines " + repr(sorted(changed_lines)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import random
+import unittest
+
+import style_checker
+
+from tests.samples import SAMPLE_SOURCE
+
+
+def full_report(lines):
+    checker_names = list(style_checker.checker_registry)
+    output = style_checker.new_output(checker_names)
+    error_count = style_checker.new_error_count(checker_names)
+    style_checker.BaseChecker(style_checker.make_checkers()).check_styles(lines, output, error_count)
+    return [(key, [str(item) for item in value_list]) for key, value_list in output.items()], list(error_count.items())
+
+
+def incremental_report(result):
+    output, error_count = result.report()
+    return [(key, [str(item) for item in value_list]) for key, value_list in output.items()], list(error_count.items())
+
+
+class IncrementalTest(unittest.TestCase):
+    def setUp(self):
+        # Long enough to have several checkpoints
+        self.lines = style_checker.split_lines(SAMPLE_SOURCE * 4)
+
+    def test_check_incremental_matches_full_check(self):
+        result = style_checker.check_incremental(self.lines)
+        self.assertEqual(incremental_report(result), full_report(self.lines))
+
+    def test_recheck_matches_full_check_after_random_edits(self):
+        edits = ["{", "}", "/*", "*/", "\"", "'", " ", "x=1", "typedef int Size;", "\t", "#include <a.h>\n", "\n"]
+        rng = random.Random(7)
+        result = style_checker.check_incremental(self.lines)
+        for iteration in range(120):
+            line_total = len(result.lines)
+            start = rng.randint(0, line_total)
+            if rng.random() < 0.4 and start < line_total:
+                # Change part of one line
+                line = result.lines[start]
+                position = rng.randint(0, len(line) - 1)
+                end = start + 1
+                new_text = line[:position] + rng.choice(edits) + line[position:]
+            else:
+                end = min(line_total, start + rng.choice([0, 1, 2, 5, 40]))
+                new_text = "".join(rng.choice(self.lines) for _ in range(rng.choice([0, 1, 2, 30])))
+            result = style_checker.recheck_incremental(result, start, end, new_text)
+            self.assertEqual(incremental_report(result), full_report(result.lines),
+                             "after edit %d (lines %d-%d replaced by %r)" % (iteration, start, end, new_text))
+
+    def test_recheck_only_checks_near_the_edit(self):
+        result = style_checker.check_incremental(self.lines)
+        middle = len(self.lines) // 2
+        result = style_checker.recheck_incremental(result, middle, middle + 1, "    int unused;\n")
+        self.assertLess(result.checked_lines, len(self.lines) // 2)
+
+    def test_recheck_splits_lines_like_files(self):
+        result = style_checker.check_incremental(self.lines)
+        result = style_checker.recheck_incremental(result, 0, 0, "int a;\r\nint b;\x0cint c;\rint d;\n")
+        self.assertEqual(result.lines[:3], ["int a;\n", "int b;\x0cint c;\n", "int d;\n"])
+        self.assertEqual(incremental_report(result), full_report(result.lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import style_checker
+
+
+def scan_all(lines):
+    lexer = style_checker.CLexer()
+    return [lexer.scan(line) for line in lines]
+
+
+class CLexerTest(unittest.TestCase):
+    def test_plain_code_is_unchanged(self):
+        info = scan_all(["int main(void) {\n"])[0]
+        self.assertEqual(info.code, "int main(void) {\n")
+        self.assertFalse(info.has_comment)
+        self.assertEqual((info.opens, info.closes), (1, 0))
+        self.assertIsNone(info.directive)
+
+    def test_string_contents_are_blanked(self):
+        contents = "{ /* not a comment */ }\\n"
+        line = 'printf("' + contents + '", x); // done\n'
+        info = scan_all([line])[0]
+        self.assertEqual(len(info.code), len(line))
+        self.assertEqual(info.code.rstrip(), 'printf("' + " " * len(contents) + '", x);')
+        self.assertEqual(info.string_spans, [(7, 9 + len(contents))])
+        self.assertEqual((info.opens, info.closes), (0, 0))
+        self.assertTrue(info.has_comment)
+        self.assertFalse(info.comment_only)
+
+    def test_escaped_quotes_stay_inside_the_string(self):
+        line = 's = "a \\" { b"; t = 1;\n'
+        info = scan_all([line])[0]
+        self.assertEqual(info.code, 's = "' + " " * 8 + '"; t = 1;\n')
+        self.assertEqual(info.opens, 0)
+
+    def test_char_literals(self):
+        lines = ["if (c == '{' || c == '\"' || c == '\\'') {\n", "char slash = '/';\n"]
+        first, second = scan_all(lines)
+        self.assertEqual(first.code, "if (c == ' ' || c == ' ' || c == '  ') {\n")
+        self.assertEqual((first.opens, first.closes), (1, 0))
+        self.assertEqual(len(first.string_spans), 3)
+        # A quote in a char literal does not open a string, and / is not a comment
+        self.assertEqual(second.code, "char slash = ' ';\n")
+        self.assertFalse(second.has_comment)
+
+    def test_comment_spanning_lines(self):
+        lines = ["int a; /* start {\n", "   still { a comment \"\n", "   end */ int b; {\n", "int c;\n"]
+        first, middle, last, after = scan_all(lines)
+        self.assertEqual(first.code, "int a;" + " " * 11 + "\n")
+        self.assertFalse(first.in_comment)
+        self.assertTrue(first.has_comment)
+        self.assertTrue(middle.in_comment)
+        self.assertTrue(middle.comment_only)
+        self.assertEqual(middle.code.strip(), "")
+        self.assertEqual(middle.opens, 0)
+        self.assertTrue(last.in_comment)
+        self.assertEqual(last.code, " " * 9 + " int b; {\n")
+        self.assertEqual(last.opens, 1)
+        self.assertFalse(after.in_comment)
+        self.assertEqual(after.code, "int c;\n")
+
+    def test_comment_markers_inside_strings_and_comments(self):
+        lines = ['char *s = "/*"; int x;\n', "/* // */ int y;\n", "// /* not opened\n", "int z;\n"]
+        string_line, block, line_comment, after = scan_all(lines)
+        self.assertEqual(string_line.code, 'char *s = "  "; int x;\n')
+        self.assertFalse(string_line.has_comment)
+        self.assertEqual(block.code, " " * 8 + " int y;\n")
+        self.assertTrue(line_comment.comment_only)
+        self.assertFalse(after.in_comment)
+        self.assertEqual(after.code, "int z;\n")
+
+    def test_directives(self):
+        infos = scan_all(["#include <stdio.h>\n", "  #  define MAX 10\n", "#if 0 /* x */\n", "x = a # b;\n"])
+        self.assertEqual([info.directive for info in infos], ["include", "define", "if", None])
+
+    def test_unterminated_string_ends_at_the_line(self):
+        first, second = scan_all(['s = "abc {\n', "int d;\n"])
+        self.assertEqual(first.code, 's = "' + " " * 5 + "\n")
+        self.assertEqual(first.opens, 0)
+        self.assertEqual(second.code, "int d;\n")
+
+    def test_line_endings_are_kept(self):
+        info = scan_all(['x = "a"; // c\r\n'])[0]
+        self.assertEqual(info.code, 'x = " ";' + " " * 5 + "\r\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
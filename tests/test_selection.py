@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import style_checker
+
+from tests.samples import SAMPLE_SOURCE
+
+
+def found_rules(result):
+    return set(diagnostic.checker + "." + diagnostic.rule for diagnostic in result.diagnostics)
+
+
+class RuleSelectionTest(unittest.TestCase):
+    def test_everything_is_selected_by_default(self):
+        selection = style_checker.RuleSelection()
+        self.assertEqual(selection.checker_names(), list(style_checker.checker_registry))
+        self.assertTrue(selection.rule_enabled("HorizontalSpaceChecker", "lr_spacing.relational"))
+
+    def test_select_checkers(self):
+        selection = style_checker.RuleSelection(["LineLengthChecker", "IndentationChecker"])
+        self.assertEqual(selection.checker_names(), ["LineLengthChecker", "IndentationChecker"])
+        self.assertEqual([checker.__class__.__name__ for checker in style_checker.make_checkers(selection)],
+                         ["LineLengthChecker", "IndentationChecker"])
+
+    def test_more_specific_selector_wins(self):
+        selection = style_checker.RuleSelection(["HorizontalSpaceChecker"], ["HorizontalSpaceChecker.over_spacing"])
+        self.assertTrue(selection.rule_enabled("HorizontalSpaceChecker", "lr_spacing.pointer"))
+        self.assertFalse(selection.rule_enabled("HorizontalSpaceChecker", "over_spacing.pointer"))
+        selection = style_checker.RuleSelection(["HorizontalSpaceChecker.over_spacing.logical"], ["HorizontalSpaceChecker"])
+        self.assertTrue(selection.checker_enabled("HorizontalSpaceChecker"))
+        self.assertTrue(selection.rule_enabled("HorizontalSpaceChecker", "over_spacing.logical"))
+        self.assertFalse(selection.rule_enabled("HorizontalSpaceChecker", "over_spacing.pointer"))
+
+    def test_ignore_a_whole_checker(self):
+        selection = style_checker.RuleSelection([], ["IndentationChecker", "NamingChecker"])
+        self.assertNotIn("IndentationChecker", selection.checker_names())
+        self.assertNotIn("NamingChecker", selection.checker_names())
+        self.assertIn("BlocksChecker", selection.checker_names())
+
+    def test_unknown_selectors_are_rejected(self):
+        for select, ignore in [(["NoSuchChecker"], []), ([], ["HorizontalSpaceChecker.nope"]),
+                               (["NamingChecker.nope"], []), (["LineLengthChecker.max"], []),
+                               (["IndentationChecker.tab"], [])]:
+            with self.assertRaises(ValueError):
+                style_checker.RuleSelection(select, ignore)
+
+    def test_a_rule_prefix_is_accepted(self):
+        style_checker.RuleSelection(["HorizontalSpaceChecker.lr_spacing"])
+
+
+class SelectedCheckTest(unittest.TestCase):
+    def check(self, select=(), ignore=()):
+        return style_checker.check_source(SAMPLE_SOURCE, selection=style_checker.RuleSelection(select, ignore))
+
+    def test_only_selected_rules_report(self):
+        result = self.check(["HorizontalSpaceChecker.lr_spacing", "NamingChecker.function_case"])
+        self.assertEqual(found_rules(result), set(["HorizontalSpaceChecker.lr_spacing.assignment",
+                                                   "HorizontalSpaceChecker.lr_spacing.arithmetic",
+                                                   "HorizontalSpaceChecker.lr_spacing.pointer",
+                                                   "NamingChecker.function_case"]))
+        self.assertEqual(list(result.totals), ["NamingChecker", "HorizontalSpaceChecker"])
+
+    def test_ignored_rules_do_not_report_or_count(self):
+        full = self.check()
+        result = self.check(ignore=["NamingChecker.function_case", "LineLengthChecker.warning_length"])
+        self.assertEqual(found_rules(result),
+                         found_rules(full) - set(["NamingChecker.function_case", "LineLengthChecker.warning_length"]))
+        function_case = len([diagnostic for diagnostic in full.diagnostics if diagnostic.rule == "function_case"])
+        self.assertEqual(result.totals["NamingChecker"], full.totals["NamingChecker"] - function_case)
+
+    def test_selected_findings_are_the_full_findings_of_those_rules(self):
+        full = self.check()
+        for select in [["LineLengthChecker.warning_length"], ["NamingChecker.struct_union_case", "BlocksChecker"],
+                       ["HorizontalSpaceChecker.other_rules"]]:
+            result = self.check(select)
+            wanted = [diagnostic for diagnostic in full.diagnostics
+                      if [selector for selector in select
+                          if (diagnostic.checker + "." + diagnostic.rule + ".").startswith(selector + ".")]]
+            self.assertEqual([(diagnostic.checker, diagnostic.rule, diagnostic.line, diagnostic.column) for diagnostic in result.diagnostics],
+                             [(diagnostic.checker, diagnostic.rule, diagnostic.line, diagnostic.column) for diagnostic in wanted],
+                             "select " + repr(select))
+
+
+class LoadSelectionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.directory, ".style_checker.cfg")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_config(self, text):
+        with open(self.config_file, "w") as config_fd:
+            config_fd.write(text)
+
+    def test_config_file_and_command_line(self):
+        self.write_config("[style_checker]\nselect = LineLengthChecker, NamingChecker\nignore = NamingChecker.single_letter\n")
+        selection = style_checker.load_selection(self.config_file)
+        self.assertEqual(selection.select, ("LineLengthChecker", "NamingChecker"))
+        self.assertEqual(selection.ignore, ("NamingChecker.single_letter",))
+        # The command line takes precedence over the config file
+        selection = style_checker.load_selection(self.config_file, "BlocksChecker")
+        self.assertEqual(selection.select, ("BlocksChecker",))
+        self.assertEqual(selection.ignore, ("NamingChecker.single_letter",))
+
+    def test_broken_or_missing_config_file(self):
+        self.write_config("[style_checker\nselect = x\n")
+        with self.assertRaises(ValueError):
+            style_checker.load_selection(self.config_file)
+        with self.assertRaises(ValueError):
+            style_checker.load_selection(os.path.join(self.directory, "missing.cfg"))
+
+
+if __name__ == "__main__":
+    unittest.main()